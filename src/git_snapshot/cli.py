@@ -3,13 +3,12 @@ from pathlib import Path
 
 import click
 
-from git_snapshot.core import _create_snapshot_logic, _restore_snapshot_logic
 from git_snapshot.exceptions import GitSnapshotException
-from git_snapshot.utils import get_git_root
+from git_snapshot.utils import SNAPSHOT_FORMATS, get_git_root
 
 
 @click.group(
-    help="Create a .7z snapshot of a local Git repository, respecting .gitignore rules, or restore one."
+    help="Create a .7z (or .tar.zst/.zip) snapshot of a local Git repository, respecting .gitignore rules, or restore one."
 )
 def cli():
     """
@@ -20,6 +19,11 @@ def cli():
 
 
 @cli.command("create")
+@click.argument(
+    "paths",
+    nargs=-1,
+    type=click.Path(exists=True, path_type=Path),
+)
 @click.option(
     "-s",
     "--source",
@@ -34,21 +38,73 @@ def cli():
     "--output",
     type=click.Path(file_okay=False, dir_okay=True, writable=True, path_type=Path),
     default=None,
-    help="Directory to save the generated .7z file. Defaults to './snapshots/' within the Git repository root.",
+    help="Directory to save the generated snapshot file. Defaults to './snapshots/' within the Git repository root.",
 )
 @click.option(
     "-v", "--verbose", is_flag=True, default=False, help="Enable verbose output."
 )
-def create_command(source: Path, output: Path | None, verbose: bool):
+@click.option(
+    "--format",
+    "archive_format",
+    type=click.Choice(SNAPSHOT_FORMATS),
+    default="7z",
+    help="Archive format. 'tar.zst' compresses with multi-threaded Zstandard and is much faster on large repositories.",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(["lzma2", "zstd"]),
+    default="lzma2",
+    help="Compression method for the .7z archive. 'zstd' is much faster but requires a 7-Zip build with Zstandard support to open outside git-snapshot.",
+)
+@click.option(
+    "--level",
+    type=click.IntRange(0, 22),
+    default=None,
+    help="Compression level (0-9 for lzma2 and zip, 1-22 for zstd and tar.zst). Defaults to py7zr's LZMA2 preset, zstd level 3 or zip level 6.",
+)
+@click.option(
+    "--prune-common",
+    is_flag=True,
+    default=False,
+    help="Skip __pycache__, .venv and node_modules directories even if .gitignore does not exclude them.",
+)
+@click.option(
+    "--threads",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Compression worker threads for tar.zst snapshots and for 7z snapshots written by a native 7-Zip executable. Defaults to one per CPU.",
+)
+def create_command(
+    paths: tuple[Path, ...],
+    source: Path,
+    output: Path | None,
+    verbose: bool,
+    archive_format: str,
+    compression: str,
+    level: int | None,
+    prune_common: bool,
+    threads: int | None,
+):
     """
-    Create a .7z snapshot of a local Git repository, respecting .gitignore rules.
+    Create a .7z, .tar.zst or .zip snapshot of a local Git repository, respecting .gitignore rules.
     Automatically excludes the output directory if it's within the repository.
+    Optional PATHS restrict the working-tree part of the snapshot to those files or directories.
 
     Args:
+        paths (tuple[Path, ...]): Files or directories inside the repository to snapshot; empty for all.
         source (Path): Path to the local Git repository.
-        output (Path | None): Directory to save the generated .7z file.
+        output (Path | None): Directory to save the generated snapshot file.
         verbose (bool): Enable verbose output.
+        archive_format (str): Archive format, one of "7z", "tar.zst" or "zip".
+        compression (str): Compression method for 7z archives, either "lzma2" or "zstd".
+        level (int | None): Compression level, or None for the method's default.
+        prune_common (bool): Skip common dependency and cache directories.
+        threads (int | None): Compression worker threads for tar.zst and native 7-Zip, or None
+                              for one per CPU.
     """
+    # Imported here so that --help and usage errors don't pay for loading the archive stack.
+    from git_snapshot.core import _create_snapshot_logic
+
     repo_root = get_git_root(source)
     if not repo_root:
         raise GitSnapshotException(
@@ -67,7 +123,17 @@ def create_command(source: Path, output: Path | None, verbose: bool):
         if verbose:
             click.echo(f"Using specified output directory: {final_output_dir}")
 
-    _create_snapshot_logic(source, final_output_dir, verbose)
+    _create_snapshot_logic(
+        source,
+        final_output_dir,
+        verbose,
+        compression,
+        level,
+        archive_format,
+        list(paths),
+        prune_common,
+        threads,
+    )
 
 
 @cli.command("restore")
@@ -95,14 +161,16 @@ def create_command(source: Path, output: Path | None, verbose: bool):
 )
 def restore_command(snapshot_file: Path, output: Path, verbose: bool, keep_venv: bool):
     """
-    Restore a .7z snapshot to a local directory, with automatic stash and reroll on failure.
+    Restore a .7z, .tar.zst or .zip snapshot to a local directory, with automatic stash and reroll on failure.
 
     Args:
-        snapshot_file (Path): Path to the .7z snapshot file to restore.
+        snapshot_file (Path): Path to the snapshot file to restore.
         output (Path): Directory to restore the snapshot to.
         verbose (bool): Enable verbose output.
         keep_venv (bool): Flag to keep the .venv directory during restoration.
     """
+    from git_snapshot.core import _restore_snapshot_logic
+
     _restore_snapshot_logic(snapshot_file, output, verbose, keep_venv)
 
 
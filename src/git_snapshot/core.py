@@ -1,41 +1,600 @@
 # src/git_snapshot/core.py
-import datetime
 import os
+import queue
 import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 import click
-import py7zr
-from pathspec import PathSpec
-from pathspec.patterns import GitWildMatchPattern
 
 from git_snapshot.exceptions import GitSnapshotException
 from git_snapshot.utils import (
     _clear_directory_contents,
+    _discard_directory,
+    _extract_snapshot,
     _get_archive_app_name,
+    _open_snapshot,
     _remove_directory_robustly,
+    _restore_set_aside_directory,
     _revert_from_stash,
+    _set_aside_directory,
     _stash_directory_state,
+    _wait_pending_cleanups,
+    _write_snapshot_archive,
+    compile_gitignore_matcher,
     get_git_root,
+    list_git_files,
+    literal_directory_names,
     parse_gitignore,
+    patterns_match_basename_only,
 )
 
 
-def _create_snapshot_logic(source_path: Path, output_dir: Path, verbose: bool = False):
+# Read size used by py7zr when feeding source files to the compressor. Older py7zr
+# releases default to a much smaller buffer, which dominates throughput.
+_ARCHIVE_BLOCKSIZE = 1 << 20
+
+# Marks the end of discovery on the create pipeline's queue.
+_END_OF_FILES = object()
+# Bound on files discovered ahead of the archive writer.
+_FILE_QUEUE_SIZE = 1024
+# How often (in seconds) a producer blocked on the full queue checks whether to give up.
+_QUEUE_PUT_TIMEOUT = 0.1
+
+# Dependency and bytecode caches skipped by `create --prune-common`. They are often missing
+# from a project's .gitignore but never belong in a source snapshot.
+COMMON_PRUNE_DIRS = frozenset({"__pycache__", ".venv", "node_modules"})
+
+# (directory prefix relative to the repository root, compiled matcher for that directory's
+# .gitignore, whether every pattern in it matches on the basename alone, directory names it
+# ignores literally)
+_IgnoreScope = tuple[str, Callable[[str], bool], bool, frozenset[str]]
+
+# (absolute directory path, its prefix relative to the repository root with a trailing '/',
+# the ignore scopes that apply inside it, or None inside `.git` where everything is archived)
+_PendingDir = tuple[str, str, tuple[_IgnoreScope, ...] | None]
+
+# Directory scans run concurrently in the fallback walker; os.scandir releases the GIL,
+# so several threads hide per-directory latency on cold caches and network filesystems.
+_WALK_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+
+def _make_ignore_scope(relative_prefix: str, patterns: list[str]) -> _IgnoreScope:
+    """
+    Compiles the patterns of one .gitignore file into a walker scope.
+
+    Args:
+        relative_prefix (str): Prefix of the directory holding the .gitignore, relative to the
+                               repository root, with a trailing '/' (empty for the root).
+        patterns (list[str]): The .gitignore patterns.
+
+    Returns:
+        _IgnoreScope: The scope to push for that directory's subtree.
+    """
+    return (
+        relative_prefix,
+        compile_gitignore_matcher(patterns),
+        patterns_match_basename_only(patterns),
+        literal_directory_names(patterns),
+    )
+
+
+def _is_ignored(
+    scopes: tuple[_IgnoreScope, ...], relative_path: str, name: str, is_dir: bool
+) -> bool:
+    """
+    Checks a path against every .gitignore scope along its ancestry.
+    Scopes whose patterns contain no '/' are matched against the entry's name only,
+    which keeps the regex input short regardless of how deep the entry is, and directories
+    named literally in a scope (such as `node_modules/`) are pruned by a set lookup.
+
+    Args:
+        scopes (tuple[_IgnoreScope, ...]): The .gitignore scopes along the path's ancestry.
+        relative_path (str): Path relative to the repository root, using forward slashes.
+        name (str): The final component of the path.
+        is_dir (bool): Whether the path is a directory, so directory-only patterns apply.
+
+    Returns:
+        bool: True if any scope ignores the path.
+    """
+    for scope_prefix, matches, basename_only, literal_dirs in scopes:
+        if is_dir and name in literal_dirs:
+            return True
+        scoped_path = name if basename_only else relative_path[len(scope_prefix) :]
+        # A directory is tested once, in its '/'-suffixed form, which every pattern that
+        # could match the bare name also matches; this also lets "!dir/" re-include it.
+        if matches(f"{scoped_path}/" if is_dir else scoped_path):
+            return True
+    return False
+
+
+def _scopes_for_start_path(
+    repo_root: Path,
+    root_scopes: tuple[_IgnoreScope, ...],
+    start_path: str,
+    verbose: bool = False,
+) -> tuple[_IgnoreScope, ...] | None:
+    """
+    Collects the .gitignore scopes that apply to a walk starting below the repository root.
+    Only the .gitignore files of the start path's ancestors are read, and each ancestor is
+    checked on the way down so that a start path inside an ignored directory yields nothing.
+
+    Args:
+        repo_root (Path): The root directory of the Git repository.
+        root_scopes (tuple[_IgnoreScope, ...]): The scopes of the repository root.
+        start_path (str): The start path relative to `repo_root`, using forward slashes.
+        verbose (bool): If True, enable verbose output.
+
+    Returns:
+        tuple[_IgnoreScope, ...] | None: The scopes for `start_path`'s parent directory, or None
+                                         if `start_path` or one of its ancestors is ignored.
+    """
+    scopes = root_scopes
+    parts = start_path.split("/")
+    if parts[0] == ".git":
+        return None
+    for depth, name in enumerate(parts):
+        relative_path = "/".join(parts[: depth + 1])
+        abs_path = repo_root / relative_path
+        is_dir = abs_path.is_dir() and not abs_path.is_symlink()
+        if _is_ignored(scopes, relative_path, name, is_dir=is_dir):
+            return None
+        if depth < len(parts) - 1 and (abs_path / ".gitignore").is_file():
+            nested_patterns = parse_gitignore(abs_path, verbose=verbose)
+            if nested_patterns:
+                scopes = scopes + (
+                    _make_ignore_scope(f"{relative_path}/", nested_patterns),
+                )
+    return scopes
+
+
+def _scan_directory(
+    pending_dir: _PendingDir,
+    prune_dirs: frozenset[str] = frozenset(),
+    excluded_dir: str | None = None,
+    verbose: bool = False,
+) -> tuple[list[str], list[_PendingDir]]:
+    """
+    Scans one directory for the fallback walker: reads its nested .gitignore (if any) and
+    splits its entries into files to archive and subdirectories still to scan.
+
+    Args:
+        pending_dir (_PendingDir): The directory to scan.
+        prune_dirs (frozenset[str]): Directory names to skip wherever they appear.
+        excluded_dir (str | None): A directory to skip, relative to the repository root.
+        verbose (bool): If True, enable verbose output.
+
+    Returns:
+        tuple[list[str], list[_PendingDir]]: Relative paths of the files to archive, and the
+                                             subdirectories that are not ignored.
+    """
+    abs_dir, relative_prefix, scopes = pending_dir
+    files: list[str] = []
+    subdirs: list[_PendingDir] = []
+    try:
+        with os.scandir(abs_dir) as it:
+            entries = list(it)
+    except OSError as e:
+        click.echo(f"Warning: Could not read directory '{abs_dir}': {e}", err=True)
+        return files, subdirs
+
+    if scopes is None:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, f"{relative_prefix}{entry.name}/", None))
+            else:
+                files.append(relative_prefix + entry.name)
+        return files, subdirs
+
+    if relative_prefix and any(entry.name == ".gitignore" for entry in entries):
+        nested_patterns = parse_gitignore(Path(abs_dir), verbose=verbose)
+        if nested_patterns:
+            scopes = scopes + (_make_ignore_scope(relative_prefix, nested_patterns),)
+
+    for entry in entries:
+        relative_path = relative_prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name == ".git":
+                # The top-level `.git` is handled by the caller; a nested repository's is
+                # archived whole, without ignore rules or pruning.
+                if relative_prefix:
+                    subdirs.append((entry.path, f"{relative_path}/", None))
+                continue
+            if entry.name in prune_dirs or relative_path == excluded_dir:
+                continue
+            if not _is_ignored(scopes, relative_path, entry.name, is_dir=True):
+                subdirs.append((entry.path, f"{relative_path}/", scopes))
+        elif not _is_ignored(scopes, relative_path, entry.name, is_dir=False):
+            files.append(relative_path)
+    return files, subdirs
+
+
+def _walk_working_tree(
+    repo_root: Path,
+    excluded_output_dir: str | None,
+    verbose: bool = False,
+    start_paths: list[str] | None = None,
+    prune_dirs: frozenset[str] = frozenset(),
+    include_git_dir: bool = False,
+) -> Iterator[str]:
+    """
+    Fallback enumeration of the working tree used when `git ls-files` is unavailable.
+    Walks the repository with an `os.scandir` stack, applying every .gitignore file found along
+    the way; the top-level `.git` directory is either skipped or, with `include_git_dir`,
+    archived whole in the same traversal without any ignore rules, and the `.git` directory of
+    a nested repository or submodule is always archived that way. Each .gitignore is scoped to the directory containing it, and ignored directories are never scanned: each
+    subdirectory is tested before it is pushed, so an ignored subtree costs a single match.
+    This stays correct with negated patterns because, as in Git, a file cannot be re-included
+    once one of its parent directories is excluded.
+    Entry types come from the cached `DirEntry` data, so no extra `stat` call is made per entry;
+    symlinks are archived as links and never followed. Directories are scanned by a small thread
+    pool and files are yielded as each scan completes, so their order is not deterministic.
+
+    Args:
+        repo_root (Path): The root directory of the Git repository.
+        excluded_output_dir (str | None): Output directory relative to `repo_root`
+                                          (POSIX form) to exclude, if it lies inside the repository.
+        verbose (bool): If True, enable verbose output.
+        start_paths (list[str] | None): Paths relative to `repo_root` (POSIX form, none nested
+                                        inside another) to restrict the walk to, or None for
+                                        the whole repository.
+        prune_dirs (frozenset[str]): Directory names to skip wherever they appear.
+        include_git_dir (bool): If True, also yield every file under the top-level `.git`.
+
+    Yields:
+        str: Paths of files to archive, relative to `repo_root`, using forward slashes.
+    """
+    root_patterns = parse_gitignore(repo_root, verbose=verbose)
+
+    # The output directory is a literal path, so it is skipped by a string comparison
+    # rather than an extra pattern in the root matcher.
+    if excluded_output_dir and verbose:
+        click.echo(
+            f"Automatically excluding output directory '{excluded_output_dir}' from snapshot."
+        )
+
+    root_scopes = (_make_ignore_scope("", root_patterns),)
+    # Scopes of None mark the `.git` subtree, where every entry is archived.
+    pending_dirs: list[_PendingDir] = []
+    if include_git_dir:
+        pending_dirs.append((str(repo_root / ".git"), ".git/", None))
+    if not start_paths:
+        pending_dirs.append((str(repo_root), "", root_scopes))
+    for start_path in start_paths or []:
+        if excluded_output_dir and (
+            start_path == excluded_output_dir
+            or start_path.startswith(f"{excluded_output_dir}/")
+        ):
+            continue
+        start_scopes = _scopes_for_start_path(
+            repo_root, root_scopes, start_path, verbose
+        )
+        if start_scopes is None:
+            continue
+        abs_start_path = repo_root / start_path
+        if abs_start_path.is_dir() and not abs_start_path.is_symlink():
+            pending_dirs.append((str(abs_start_path), f"{start_path}/", start_scopes))
+        else:
+            yield start_path
+
+    # Finished scans are pushed onto a queue by their done-callbacks, so picking up the next
+    # one costs the same however many scans are still pending.
+    completed_scans: queue.SimpleQueue[Future] = queue.SimpleQueue()
+    with ThreadPoolExecutor(max_workers=_WALK_WORKERS) as executor:
+
+        def submit_scan(pending_dir: _PendingDir):
+            executor.submit(
+                _scan_directory, pending_dir, prune_dirs, excluded_output_dir, verbose
+            ).add_done_callback(completed_scans.put)
+
+        for pending_dir in pending_dirs:
+            submit_scan(pending_dir)
+        outstanding = len(pending_dirs)
+        while outstanding:
+            files, subdirs = completed_scans.get().result()
+            outstanding += len(subdirs) - 1
+            for subdir in subdirs:
+                submit_scan(subdir)
+            yield from files
+
+
+def _solid_order_key(relative_path: str) -> tuple[str, str]:
+    """
+    Sort key placing files with the same extension next to each other in the archive.
+
+    Args:
+        relative_path (str): Path relative to the repository root, using forward slashes.
+
+    Returns:
+        tuple[str, str]: The lower-cased extension, then the path itself.
+    """
+    return (os.path.splitext(relative_path)[1].lower(), relative_path)
+
+
+def _walk_git_directory(repo_root: Path) -> Iterator[str]:
+    """
+    Yields every file under the repository's `.git` directory.
+
+    Args:
+        repo_root (Path): The root directory of the Git repository.
+
+    Yields:
+        str: Paths relative to `repo_root`, using forward slashes.
+    """
+    git_path_in_repo = repo_root / ".git"
+    root_prefix_len = len(str(repo_root)) + 1
+    # On POSIX, os.fwalk threads a directory descriptor through the walk (openat/fstatat)
+    # instead of resolving every path from the root, which adds up in large object stores.
+    if hasattr(os, "fwalk"):
+        git_dirs = (
+            (root, files) for root, _, files, _ in os.fwalk(str(git_path_in_repo))
+        )
+    else:
+        git_dirs = ((root, files) for root, _, files in os.walk(git_path_in_repo))
+    for root, files in git_dirs:
+        relative_root = root[root_prefix_len:].replace(os.sep, "/")
+        for f in files:
+            yield f"{relative_root}/{f}"
+
+
+def _iter_snapshot_files(
+    repo_root: Path,
+    excluded_output_dir: str | None,
+    verbose: bool = False,
+    start_paths: list[str] | None = None,
+    prune_dirs: frozenset[str] = frozenset(),
+) -> Iterator[str]:
+    """
+    Yields every file that belongs in the snapshot: the whole `.git` directory followed by the
+    working-tree files Git does not ignore (from `git ls-files`, grouped by extension) and the
+    contents of any submodules or nested repositories, or, when Git is unavailable, all of it
+    from a single pass of the fallback walker.
+
+    Args:
+        repo_root (Path): The root directory of the Git repository.
+        excluded_output_dir (str | None): Output directory relative to `repo_root`
+                                          (POSIX form) to exclude, if it lies inside the repository.
+        verbose (bool): If True, enable verbose output.
+        start_paths (list[str] | None): Paths relative to `repo_root` (POSIX form) to restrict
+                                        the working-tree files to, or None for the whole repository.
+        prune_dirs (frozenset[str]): Directory names whose contents are left out of the
+                                     working-tree files wherever they appear.
+
+    Yields:
+        str: Paths relative to `repo_root`, using forward slashes.
+    """
+    include_git_dir = (repo_root / ".git").is_dir()
+    if include_git_dir and verbose:
+        click.echo("Including .git directory contents in the snapshot.")
+
+    working_tree_files = list_git_files(repo_root, start_paths)
+    if working_tree_files is None:
+        if verbose:
+            click.echo(
+                "Could not list files with 'git ls-files'. Falling back to walking the directory tree."
+            )
+        yield from _walk_working_tree(
+            repo_root,
+            excluded_output_dir,
+            verbose,
+            start_paths,
+            prune_dirs,
+            include_git_dir,
+        )
+        return
+
+    if include_git_dir:
+        yield from _walk_git_directory(repo_root)
+
+    # `git ls-files` stops at submodules and nested repositories, so their contents (including
+    # their own `.git` entry) come from the fallback walker instead.
+    nested_repos = [f[:-1] for f in working_tree_files if f.endswith("/")]
+    if nested_repos:
+        working_tree_files = [f for f in working_tree_files if not f.endswith("/")]
+
+    if prune_dirs:
+        working_tree_files = [
+            f for f in working_tree_files if prune_dirs.isdisjoint(f.split("/")[:-1])
+        ]
+        nested_repos = [f for f in nested_repos if prune_dirs.isdisjoint(f.split("/"))]
+
+    # The list is already in memory, so group files by extension: similar content lands next
+    # to each other in the solid stream, which improves the compressor's match hits.
+    working_tree_files.sort(key=_solid_order_key)
+
+    if excluded_output_dir:
+        if verbose:
+            click.echo(
+                f"Automatically excluding output directory '{excluded_output_dir}' from snapshot."
+            )
+        output_prefix = f"{excluded_output_dir}/"
+        yield from (f for f in working_tree_files if not f.startswith(output_prefix))
+    else:
+        yield from working_tree_files
+
+    if nested_repos:
+        yield from _walk_working_tree(
+            repo_root, excluded_output_dir, False, nested_repos, prune_dirs
+        )
+
+
+def _relative_start_paths(repo_root: Path, paths: list[Path]) -> list[str] | None:
     """
-    Core logic to create a .7z snapshot of the Git repository.
-    This function finds the Git repository root, applies .gitignore rules
-    (including automatically excluding the output directory if it's inside the repo),
-    and compresses the relevant files into a .7z archive.
+    Converts user-supplied snapshot paths into repository-relative POSIX paths, dropping any
+    path nested inside another one so no file is listed twice.
+
+    Args:
+        repo_root (Path): The root directory of the Git repository.
+        paths (list[Path]): Paths given on the command line, relative to the current directory.
+
+    Returns:
+        list[str] | None: Sorted relative paths, or None if no restriction applies (no paths
+                          given, or one of them is the repository root itself).
+
+    Raises:
+        GitSnapshotException: If a path lies outside the repository.
+    """
+    relative_paths: list[str] = []
+    for path in paths:
+        resolved = path.resolve()
+        if not resolved.is_relative_to(repo_root):
+            raise GitSnapshotException(
+                f"'{path}' is not inside the Git repository '{repo_root}'."
+            )
+        if resolved == repo_root:
+            return None
+        relative_paths.append(resolved.relative_to(repo_root).as_posix())
+
+    start_paths: list[str] = []
+    for relative_path in sorted(relative_paths):
+        if start_paths and (
+            relative_path == start_paths[-1]
+            or relative_path.startswith(f"{start_paths[-1]}/")
+        ):
+            continue
+        start_paths.append(relative_path)
+    return start_paths or None
+
+
+def _enqueue_files(
+    files: Iterable[str],
+    file_queue: queue.Queue,
+    errors: list[BaseException],
+    stop: threading.Event,
+):
+    """
+    Producer side of the create pipeline: pushes discovered files onto a bounded queue,
+    finishing with the `_END_OF_FILES` sentinel. Runs in a background thread, so any
+    exception is recorded in `errors` for the consumer to re-raise. Once `stop` is set (the
+    consumer is gone), it returns instead of waiting for room on the queue.
+
+    Args:
+        files (Iterable[str]): The files to enqueue, typically from `_iter_snapshot_files`.
+        file_queue (queue.Queue): The bounded queue consumed by the archive writer.
+        errors (list[BaseException]): Receives the exception that stopped discovery, if any.
+        stop (threading.Event): Set by the consumer when it stops reading the queue.
+    """
+
+    def put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                file_queue.put(item, timeout=_QUEUE_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for relative_file in files:
+            if not put(relative_file):
+                return
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        put(_END_OF_FILES)
+
+
+def _validate_compression_level(label: str, level: int, low: int, high: int):
+    """
+    Ensures a compression level lies within the range supported by the chosen method.
+
+    Args:
+        label (str): The compression method or format, used in the error message.
+        level (int): The requested compression level.
+        low (int): The lowest accepted level.
+        high (int): The highest accepted level.
+
+    Raises:
+        GitSnapshotException: If the level is out of range.
+    """
+    if not low <= level <= high:
+        raise GitSnapshotException(
+            f"Invalid compression level {level} for {label}: expected a value between {low} and {high}."
+        )
+
+
+def _build_compression_filters(
+    archive_format: str, compression: str, level: int | None
+) -> list[dict[str, int]] | None:
+    """
+    Translates the user-facing compression options into a py7zr filter chain, validating
+    the level for non-7z formats along the way (which do not use filters).
+
+    Args:
+        archive_format (str): One of `SNAPSHOT_FORMATS`.
+        compression (str): Compression method for 7z archives, either "lzma2" or "zstd".
+        level (int | None): Compression level, or None for the method's default.
+
+    Returns:
+        list[dict[str, int]] | None: The filter chain to pass to `py7zr.SevenZipFile`,
+                                     or None to keep py7zr's default LZMA2 filters.
+
+    Raises:
+        GitSnapshotException: If the compression method is unknown or the level is out of range.
+    """
+    if archive_format == "tar.zst":
+        if level is not None:
+            _validate_compression_level("tar.zst", level, 1, 22)
+        return None
+    if archive_format == "zip":
+        if level is not None:
+            _validate_compression_level("zip", level, 0, 9)
+        return None
+    import py7zr
+
+    if compression == "lzma2":
+        if level is None:
+            return None
+        _validate_compression_level("lzma2", level, 0, 9)
+        return [{"id": py7zr.FILTER_LZMA2, "preset": level}]
+    if compression == "zstd":
+        if level is None:
+            level = 3
+        _validate_compression_level("zstd", level, 1, 22)
+        return [{"id": py7zr.FILTER_ZSTD, "level": level}]
+    raise GitSnapshotException(f"Unsupported compression method: '{compression}'.")
+
+
+def _create_snapshot_logic(
+    source_path: Path,
+    output_dir: Path,
+    verbose: bool = False,
+    compression: str = "lzma2",
+    level: int | None = None,
+    archive_format: str = "7z",
+    paths: list[Path] | None = None,
+    prune_common: bool = False,
+    threads: int | None = None,
+):
+    """
+    Core logic to create a snapshot archive (.7z by default) of the Git repository.
+    This function finds the Git repository root, lists the non-ignored files with
+    `git ls-files` (falling back to a .gitignore-aware directory walk when Git is
+    unavailable), automatically excludes the output directory if it's inside the repo,
+    and compresses the relevant files into an archive of the requested format.
 
     Args:
         source_path (Path): The path to the local Git repository to snapshot.
-        output_dir (Path): The directory to save the generated .7z file.
+        output_dir (Path): The directory to save the generated snapshot file.
         verbose (bool): If True, enable verbose output.
+        compression (str): Compression method for 7z archives, either "lzma2" or "zstd".
+        level (int | None): Compression level, or None for the method's default.
+        archive_format (str): One of `SNAPSHOT_FORMATS`: "7z", "tar.zst" or "zip".
+        paths (list[Path] | None): Files or directories inside the repository to restrict the
+                                   working-tree part of the snapshot to (the `.git` directory is
+                                   always included). None or empty snapshots the whole repository.
+        prune_common (bool): If True, leave out `COMMON_PRUNE_DIRS` (`__pycache__`, `.venv`,
+                             `node_modules`) even when .gitignore does not exclude them.
+        threads (int | None): Compression worker threads for "tar.zst" and native 7-Zip, or
+                              None for one per CPU.
 
     Raises:
         GitSnapshotException: If the source path is not a Git repository, output directory issues occur,
-                                or compression fails.
+                                the compression options are invalid, a path lies outside the
+                                repository, or compression fails.
     """
     repo_root = get_git_root(source_path)
     if not repo_root:
@@ -47,27 +606,21 @@ def _create_snapshot_logic(source_path: Path, output_dir: Path, verbose: bool =
         click.echo(f"Detected Git repository root: {repo_root}")
 
     app_name = repo_root.name
-    gitignore_patterns = parse_gitignore(repo_root, verbose=verbose)
-    all_patterns_for_spec = list(gitignore_patterns)
-
-    abs_output_dir = output_dir.resolve()
-    try:
-        if abs_output_dir.is_relative_to(repo_root):
-            relative_output_path_str = str(abs_output_dir.relative_to(repo_root))
-            exclusion_pattern = f"/{relative_output_path_str}/"
-            if exclusion_pattern not in all_patterns_for_spec:
-                all_patterns_for_spec.append(exclusion_pattern)
-                if verbose:
-                    click.echo(
-                        f"Automatically excluding output directory '{relative_output_path_str}' from snapshot."
-                    )
-    except ValueError:
-        pass
-
-    spec = PathSpec.from_lines(GitWildMatchPattern, all_patterns_for_spec)
+    filters = _build_compression_filters(archive_format, compression, level)
+    start_paths = _relative_start_paths(repo_root, paths or [])
+    if verbose and start_paths:
+        click.echo(f"Restricting snapshot to: {', '.join(start_paths)}")
+
+    root_prefix = str(repo_root) + os.sep
+    abs_output_dir = str(output_dir.resolve())
+    relative_output_path_str: str | None = None
+    if abs_output_dir.startswith(root_prefix):
+        relative_output_path_str = abs_output_dir[len(root_prefix) :].replace(
+            os.sep, "/"
+        )
 
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f"{app_name}_snapshot_{timestamp}.7z"
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    output_filename = f"{app_name}_snapshot_{timestamp}.{archive_format}"
     output_filepath = output_dir / output_filename
 
     try:
@@ -77,63 +630,54 @@ def _create_snapshot_logic(source_path: Path, output_dir: Path, verbose: bool =
             f"Error: Could not create output directory '{output_dir}': {e}"
         ) from e
 
-    actual_files_to_archive_relative: list[Path] = []
-
-    git_path_in_repo = repo_root / ".git"
-    if git_path_in_repo.is_dir():
-        if verbose:
-            click.echo("Including .git directory contents in the snapshot.")
-        for root, _, files in os.walk(git_path_in_repo):
-            current_root_path = Path(root)
-            for f in files:
-                full_path = current_root_path / f
-                relative_path = full_path.relative_to(repo_root)
-                actual_files_to_archive_relative.append(relative_path)
-
-    for root, dirs, files in os.walk(repo_root):
-        current_path = Path(root)
-
-        if current_path == repo_root and ".git" in dirs:
-            dirs.remove(".git")
-
-        dirs_to_remove = []
-        for d in dirs:
-            dir_path_abs = current_path / d
-            relative_dir_path = dir_path_abs.relative_to(repo_root)
-            if spec.match_file(str(relative_dir_path) + os.sep) or spec.match_file(
-                str(relative_dir_path)
-            ):
-                dirs_to_remove.append(d)
-
-        for d_remove in dirs_to_remove:
-            dirs.remove(d_remove)
-
-        for f in files:
-            file_path_abs = current_path / f
-            relative_file_path = file_path_abs.relative_to(repo_root)
-            if not spec.match_file(str(relative_file_path)):
-                actual_files_to_archive_relative.append(relative_file_path)
-
-    if not actual_files_to_archive_relative:
-        click.echo("No files found to compress after applying .gitignore rules.")
-        return
-
-    click.echo(
-        f"Compressing {len(actual_files_to_archive_relative)} files into {output_filepath}..."
+    prune_dirs = COMMON_PRUNE_DIRS if prune_common else frozenset()
+    if verbose and prune_dirs:
+        click.echo(f"Pruning common cache directories: {', '.join(sorted(prune_dirs))}")
+    snapshot_files = _iter_snapshot_files(
+        repo_root, relative_output_path_str, verbose, start_paths, prune_dirs
     )
+    file_queue: queue.Queue = queue.Queue(maxsize=_FILE_QUEUE_SIZE)
+    producer_errors: list[BaseException] = []
+    stop_producer = threading.Event()
+    producer = threading.Thread(
+        target=_enqueue_files,
+        args=(snapshot_files, file_queue, producer_errors, stop_producer),
+        daemon=True,
+    )
+
+    click.echo(f"Compressing files into {output_filepath}...")
+    arcname_prefix = f"{app_name}/"
     try:
-        with py7zr.SevenZipFile(output_filepath, "w") as archive:
-            for relative_file in actual_files_to_archive_relative:
-                full_path = repo_root / relative_file
-                archive.write(full_path, arcname=str(app_name / relative_file))
-        click.echo(f"Successfully created snapshot: {output_filepath}")
+        # Discovery runs in the producer thread while this thread compresses, so the
+        # directory traversal is hidden behind the compression work.
+        producer.start()
+        archived_count = _write_snapshot_archive(
+            output_filepath,
+            archive_format,
+            (
+                (root_prefix + relative_file, arcname_prefix + relative_file)
+                for relative_file in iter(file_queue.get, _END_OF_FILES)
+            ),
+            filters=filters,
+            level=level,
+            blocksize=_ARCHIVE_BLOCKSIZE,
+            threads=threads,
+        )
+        if producer_errors:
+            raise producer_errors[0]
 
-    except py7zr.Bad7zFile as e:
+        if not archived_count:
+            output_filepath.unlink()
+            click.echo("No files found to compress after applying ignore rules.")
+            return
+        click.echo(
+            f"Successfully created snapshot with {archived_count} files: {output_filepath}"
+        )
+
+    except GitSnapshotException:
         if output_filepath.exists():
             output_filepath.unlink()
-        raise GitSnapshotException(
-            f"Error creating 7z archive: {e}. The file might be corrupted or there was an issue with compression."
-        ) from e
+        raise
     except PermissionError as e:
         if output_filepath.exists():
             output_filepath.unlink()
@@ -146,6 +690,13 @@ def _create_snapshot_logic(source_path: Path, output_dir: Path, verbose: bool =
         raise GitSnapshotException(
             f"An unexpected error occurred during compression: {e}"
         ) from e
+    finally:
+        # If the writer failed, the producer may be blocked on the full queue: release it,
+        # then close the file listing so the fallback walker's thread pool shuts down too.
+        stop_producer.set()
+        if producer.ident is not None:
+            producer.join()
+        snapshot_files.close()
 
 
 def _restore_snapshot_logic(
@@ -155,9 +706,12 @@ def _restore_snapshot_logic(
     keep_venv: bool = False,
 ):
     """
-    Core logic to restore a .7z snapshot to a local directory.
-    This function handles stashing the current state in a temporary filesystem,
-    clearing the target directory, extracting the snapshot, and attempting to revert on failure.
+    Core logic to restore a snapshot (.7z, .tar.zst or .zip) to a local directory.
+    The existing target directory is first renamed aside to a hidden sibling and recreated
+    with its protected entries; the snapshot is then extracted, and the set-aside copy is
+    deleted on success or renamed back on failure. Only if the rename is not possible is the
+    current state stashed to a temporary archive and the target cleared instead, with the
+    stash extracted again to revert on failure.
 
     Args:
         snapshot_filepath (Path): The path to the snapshot file to restore.
@@ -169,115 +723,185 @@ def _restore_snapshot_logic(
         GitSnapshotException: If the snapshot file is not found, extraction fails, or other issues occur.
     """
     resolved_output_dir = output_dir.resolve()
+    resolved_snapshot_filepath = snapshot_filepath.resolve()
 
     if not snapshot_filepath.is_file():
         raise GitSnapshotException(
             f"Error: Snapshot file '{snapshot_filepath}' not found."
         )
 
-    archive_app_name = _get_archive_app_name(snapshot_filepath, verbose)
-    target_app_path = (
-        resolved_output_dir / archive_app_name
-        if archive_app_name
-        else resolved_output_dir
-    )
-
-    try:
-        resolved_output_dir.mkdir(parents=True, exist_ok=True)
-        if verbose:
-            click.echo(f"Ensured output directory exists: {resolved_output_dir}")
-    except Exception as e:
-        raise GitSnapshotException(
-            f"Error: Could not ensure output directory '{resolved_output_dir}': {e}"
-        ) from e
+    # A 7z header is parsed once here and shared by the inspection and the extraction.
+    # Every later read goes through the resolved path: moving the target aside also moves
+    # the working directory when it lies inside the target, which would break a relative one.
+    with _open_snapshot(resolved_snapshot_filepath) as snapshot_archive:
+        archive_app_name = _get_archive_app_name(
+            resolved_snapshot_filepath, verbose, snapshot_archive
+        )
+        target_app_path = (
+            resolved_output_dir / archive_app_name
+            if archive_app_name
+            else resolved_output_dir
+        )
 
-    stash_filepath: Path | None = None
-    with tempfile.TemporaryDirectory() as temp_dir_str:
-        temp_stash_base_dir = Path(temp_dir_str)
         try:
-            if target_app_path.is_dir():
+            resolved_output_dir.mkdir(parents=True, exist_ok=True)
+            if verbose:
+                click.echo(f"Ensured output directory exists: {resolved_output_dir}")
+        except Exception as e:
+            raise GitSnapshotException(
+                f"Error: Could not ensure output directory '{resolved_output_dir}': {e}"
+            ) from e
+
+        exclusions_for_clear: list[Path] = []
+
+        if keep_venv:
+            venv_path_in_target = target_app_path / ".venv"
+            if venv_path_in_target.is_dir():
+                exclusions_for_clear.append(venv_path_in_target.resolve())
                 if verbose:
                     click.echo(
-                        f"Stashing existing contents of '{target_app_path}' in temporary location..."
+                        f"Keeping existing .venv directory at {venv_path_in_target}"
                     )
-                stash_filepath = _stash_directory_state(
-                    target_app_path, temp_stash_base_dir, verbose=verbose
+
+        if resolved_snapshot_filepath.is_relative_to(target_app_path):
+            # The archive lives inside the directory being restored (typically its default
+            # snapshots/ directory, which snapshots never contain): keep the entry holding it.
+            protected_path = (
+                target_app_path
+                / resolved_snapshot_filepath.relative_to(target_app_path).parts[0]
+            )
+            exclusions_for_clear.append(protected_path)
+            if verbose:
+                click.echo(
+                    f"Keeping '{protected_path}', which contains the snapshot being restored."
                 )
-                if stash_filepath:
-                    if verbose:
-                        click.echo(f"Temporary stash created at: {stash_filepath}")
-                else:
-                    if verbose:
-                        click.echo(
-                            f"'{target_app_path}' is empty or does not exist, no stash created."
-                        )
-            else:
-                if verbose:
-                    click.echo(
-                        f"Target application directory '{target_app_path}' does not exist, no stash needed."
+
+        stash_filepath: Path | None = None
+        set_aside_path: Path | None = None
+        with tempfile.TemporaryDirectory() as temp_dir_str:
+            temp_stash_base_dir = Path(temp_dir_str)
+            try:
+                if target_app_path.is_dir() and target_app_path != resolved_output_dir:
+                    # Renaming the target aside replaces stashing and clearing it; the
+                    # stash is only needed when the rename is not possible.
+                    set_aside_path = _set_aside_directory(
+                        target_app_path, exclusions_for_clear, verbose=verbose
                     )
+                if set_aside_path is None:
+                    if target_app_path.is_dir():
+                        if verbose:
+                            click.echo(
+                                f"Stashing existing contents of '{target_app_path}' in temporary location..."
+                            )
+                        stash_filepath = _stash_directory_state(
+                            target_app_path,
+                            temp_stash_base_dir,
+                            verbose=verbose,
+                            exclusions=exclusions_for_clear,
+                        )
+                        if stash_filepath:
+                            if verbose:
+                                click.echo(
+                                    f"Temporary stash created at: {stash_filepath}"
+                                )
+                        else:
+                            if verbose:
+                                click.echo(
+                                    f"'{target_app_path}' is empty or does not exist, no stash created."
+                                )
+                    else:
+                        if verbose:
+                            click.echo(
+                                f"Target application directory '{target_app_path}' does not exist, no stash needed."
+                            )
+
+                    if target_app_path.is_dir():
+                        if verbose:
+                            click.echo(
+                                f"Clearing existing contents of '{target_app_path}' before restoration..."
+                            )
+                        _clear_directory_contents(
+                            target_app_path, exclusions_for_clear, verbose=verbose
+                        )
+                    else:
+                        if verbose:
+                            click.echo(
+                                f"'{target_app_path}' does not exist, no need to clear before extraction."
+                            )
 
-            exclusions_for_clear: list[Path] = []
+                target_app_path.mkdir(parents=True, exist_ok=True)
+
+                click.echo(
+                    f"Restoring snapshot '{snapshot_filepath}' to '{resolved_output_dir}'..."
+                )
+
+                _extract_snapshot(
+                    resolved_snapshot_filepath, resolved_output_dir, snapshot_archive
+                )
+                if set_aside_path:
+                    _discard_directory(set_aside_path, verbose=verbose)
+                _wait_pending_cleanups(verbose)
 
-            if keep_venv:
-                venv_path_in_target = target_app_path / ".venv"
-                if venv_path_in_target.is_dir():
-                    exclusions_for_clear.append(venv_path_in_target.resolve())
-                    if verbose:
+                click.echo(f"Snapshot restored successfully to {target_app_path}")
+
+            except Exception as e:
+                click.echo(f"Restoration failed: {e}", err=True)
+                _wait_pending_cleanups(verbose)
+                if set_aside_path:
+                    click.echo(
+                        "Attempting to automatically revert to previous state..."
+                    )
+                    try:
+                        _restore_set_aside_directory(
+                            set_aside_path,
+                            target_app_path,
+                            exclusions_for_clear,
+                            verbose=verbose,
+                        )
+                    except Exception as revert_e:
+                        click.echo(
+                            f"Automatic revert also failed: {revert_e}", err=True
+                        )
                         click.echo(
-                            f"Keeping existing .venv directory at {venv_path_in_target}"
+                            f"The previous contents are kept at '{set_aside_path}'.",
+                            err=True,
                         )
+                    raise GitSnapshotException(
+                        "Restoration failed, see logs above for details."
+                    ) from e
 
-            if target_app_path.is_dir():
-                if verbose:
+                if stash_filepath and stash_filepath.exists():
                     click.echo(
-                        f"Clearing existing contents of '{target_app_path}' before restoration..."
+                        "Attempting to automatically revert to previous state..."
                     )
-                _clear_directory_contents(
-                    target_app_path, exclusions_for_clear, verbose=verbose
-                )
-            else:
-                if verbose:
+                    try:
+                        _revert_from_stash(
+                            stash_filepath,
+                            target_app_path,
+                            verbose=verbose,
+                            exclusions=exclusions_for_clear,
+                        )
+                    except Exception as revert_e:
+                        click.echo(
+                            f"Automatic revert also failed: {revert_e}", err=True
+                        )
+                        click.echo(
+                            "Manual intervention may be required to restore previous state.",
+                            err=True,
+                        )
+                else:
                     click.echo(
-                        f"'{target_app_path}' does not exist, no need to clear before extraction."
+                        "No stash found or stash creation failed, cannot revert automatically.",
+                        err=True,
                     )
 
-            target_app_path.mkdir(parents=True, exist_ok=True)
-
-            click.echo(
-                f"Restoring snapshot '{snapshot_filepath}' to '{resolved_output_dir}'..."
-            )
-
-            with py7zr.SevenZipFile(snapshot_filepath, mode="r") as z:
-                z.extractall(path=resolved_output_dir)
-
-            click.echo(f"Snapshot restored successfully to {target_app_path}")
-
-        except Exception as e:
-            click.echo(f"Restoration failed: {e}", err=True)
-            if stash_filepath and stash_filepath.exists():
-                click.echo("Attempting to automatically revert to previous state...")
-                try:
-                    _revert_from_stash(stash_filepath, target_app_path, verbose=verbose)
-                except Exception as revert_e:
-                    click.echo(f"Automatic revert also failed: {revert_e}", err=True)
+                if target_app_path.is_dir() and target_app_path.exists():
                     click.echo(
-                        "Manual intervention may be required to restore previous state.",
+                        f"Cleaning up partially extracted files at: {target_app_path}",
                         err=True,
                     )
-            else:
-                click.echo(
-                    "No stash found or stash creation failed, cannot revert automatically.",
-                    err=True,
-                )
-
-            if target_app_path.is_dir() and target_app_path.exists():
-                click.echo(
-                    f"Cleaning up partially extracted files at: {target_app_path}",
-                    err=True,
-                )
-                _remove_directory_robustly(target_app_path, verbose=verbose)
+                    _remove_directory_robustly(target_app_path, verbose=verbose)
 
-            raise GitSnapshotException(
-                "Restoration failed, see logs above for details."
-            ) from e
+                raise GitSnapshotException(
+                    "Restoration failed, see logs above for details."
+                ) from e
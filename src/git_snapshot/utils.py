@@ -1,15 +1,61 @@
 # src/git_snapshot/utils.py
+import contextlib
+import functools
 import os
+import re
 import shutil
 import stat
+import subprocess
+import tarfile
+import tempfile
 import time
+import uuid
+import zipfile
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import click
-import py7zr
 
 from git_snapshot.exceptions import GitSnapshotException
 
+# py7zr and pathspec are imported where they are used: together they take longer to import
+# than the rest of the CLI, and many invocations (--help, tar.zst restores, Git-backed file
+# listing) need neither.
+if TYPE_CHECKING:
+    import py7zr
+
+# Archive formats `create` can produce and `restore` can read, also used as file suffixes.
+SNAPSHOT_FORMATS = ("7z", "tar.zst", "zip")
+
+# Files that are already compressed (Git packs and their indexes, images, archives). Running
+# them through LZMA2 or Deflate again costs CPU for next to no gain, so they are stored as-is.
+_STORED_SUFFIXES = frozenset(
+    (".pack", ".idx", ".png", ".jpg", ".jpeg", ".gif", ".webp")
+    + (".zip", ".7z", ".gz", ".bz2", ".xz", ".zst", ".jar", ".whl")
+)
+
+# Removals issued concurrently when clearing a restore target. Unlinking is dominated by
+# syscall latency, so a handful of threads overlap it well.
+_CLEAR_WORKERS = 16
+# Upper bound for a single backoff sleep while retrying a directory removal.
+_MAX_RETRY_DELAY = 0.5
+# Cleared directories are renamed to a hidden sibling with this prefix, which is instant, and
+# deleted by a small background pool while the snapshot is being extracted.
+_TRASH_PREFIX = ".git-snapshot-trash-"
+_cleanup_pool = ThreadPoolExecutor(max_workers=2)
+_pending_cleanups: list[tuple[Path, Future]] = []
+# A restore target is renamed to a hidden sibling with this prefix while the snapshot is
+# extracted, and renamed back if extraction fails.
+_SET_ASIDE_PREFIX = ".git-snapshot-previous-"
+
+# Restore stashes are short-lived and only read back by this tool, so they favour speed:
+# a multi-threaded tar.zst at a low level when Zstandard is importable, otherwise a 7z using
+# py7zr's Zstandard filter instead of its default LZMA2, fed in 1 MiB reads.
+_STASH_ZSTD_LEVEL = 3
+_STASH_BLOCKSIZE = 1 << 20
+
 
 def get_git_root(path: Path) -> Path | None:
     """
@@ -23,40 +69,74 @@ def get_git_root(path: Path) -> Path | None:
     Returns:
         Path | None: The path to the Git repository root if found, otherwise None.
     """
-    current_path = path.resolve()
-    while current_path != current_path.parent:
-        if (current_path / ".git").is_dir():
-            return current_path
-        current_path = current_path.parent
+    # Walk the ancestry as plain strings; only the result is converted to a Path.
+    current_path = os.path.realpath(path)
+    parent_path = os.path.dirname(current_path)
+    while current_path != parent_path:
+        if os.path.isdir(os.path.join(current_path, ".git")):
+            return Path(current_path)
+        current_path, parent_path = parent_path, os.path.dirname(parent_path)
     return None
 
 
-def parse_gitignore(repo_root: Path, verbose: bool = False) -> list[str]:
+@functools.lru_cache(maxsize=256)
+def _read_gitignore(gitignore_path: str, mtime_ns: int, size: int) -> tuple[str, ...]:
     """
-    Parses the root .gitignore file and returns a list of pattern strings.
-    If .gitignore is not found, returns an empty list.
+    Reads and filters the patterns of one .gitignore file. Results are cached per absolute
+    path, modification time and size, so repeated snapshots (or library callers) don't
+    re-read unchanged files, while an edited file is picked up on the next call even when
+    the filesystem's timestamp granularity hides the change.
 
     Args:
-        repo_root (Path): The root directory of the Git repository.
+        gitignore_path (str): The path to the .gitignore file.
+        mtime_ns (int): The file's modification time in nanoseconds. Only used as part of
+                        the cache key.
+        size (int): The file's size in bytes. Only used as part of the cache key.
+
+    Returns:
+        tuple[str, ...]: The non-blank, non-comment pattern lines.
+    """
+    # Blank and comment lines are dropped at the bytes level, so only surviving
+    # patterns pay for decoding.
+    data = Path(gitignore_path).read_bytes()
+    return tuple(
+        stripped.decode("utf-8", errors="replace")
+        for line in data.split(b"\n")
+        if (stripped := line.strip()) and not stripped.startswith(b"#")
+    )
+
+
+def parse_gitignore(directory: Path, verbose: bool = False) -> list[str]:
+    """
+    Parses the .gitignore file in the given directory and returns a list of pattern strings.
+    Patterns are relative to `directory`, which is usually the repository root but may be
+    any subdirectory holding a nested .gitignore. If .gitignore is not found, returns an empty list.
+
+    Args:
+        directory (Path): The directory containing the .gitignore file.
         verbose (bool): If True, print warnings if .gitignore is not found or cannot be read.
 
     Returns:
         list[str]: A list of .gitignore patterns.
     """
-    gitignore_path = repo_root / ".gitignore"
-    if not gitignore_path.is_file():
+    gitignore_path = directory / ".gitignore"
+    try:
+        gitignore_stat = gitignore_path.stat()
+    except OSError:
+        gitignore_stat = None
+    if gitignore_stat is None or not stat.S_ISREG(gitignore_stat.st_mode):
         if verbose:
-            click.echo("Warning: .gitignore not found. Proceeding without exclusions.")
+            click.echo(
+                f"Warning: .gitignore not found in '{directory}'. Proceeding without exclusions."
+            )
         return []
 
     try:
-        with open(gitignore_path, "r", encoding="utf-8") as f:
-            lines = [
-                line.strip()
-                for line in f.readlines()
-                if line.strip() and not line.strip().startswith("#")
-            ]
-        return lines
+        return list(
+            _read_gitignore(
+                str(gitignore_path), gitignore_stat.st_mtime_ns, gitignore_stat.st_size
+            )
+        )
     except Exception as e:
         click.echo(
             f"Error reading .gitignore at {gitignore_path}: {e}. Proceeding without exclusions.",
@@ -65,38 +145,245 @@ def parse_gitignore(repo_root: Path, verbose: bool = False) -> list[str]:
         return []
 
 
-def _handle_remove_read_only(func, path: str, exc_info: tuple):
+def compile_gitignore_matcher(patterns: list[str]) -> Callable[[str], bool]:
     """
-    Error handler for shutil.rmtree. If a file is read-only or permission denied,
-    attempts to change its permissions and retry the operation. This function is
-    designed to be passed as the `onerror` argument to `shutil.rmtree`.
+    Returns the compiled matcher for a list of .gitignore patterns, sharing one compiled
+    matcher between every .gitignore with the same patterns within the process.
 
     Args:
-        func (callable): The function that failed (e.g., os.remove, os.rmdir).
-        path (str): The path to the file/directory that caused the error.
-        exc_info (tuple): A tuple containing (exception type, exception value, traceback).
+        patterns (list[str]): Raw .gitignore pattern lines.
+
+    Returns:
+        Callable[[str], bool]: See `_compile_gitignore_matcher`.
     """
-    if issubclass(exc_info[0], OSError) and os.path.exists(path):
-        try:
-            os.chmod(path, stat.S_IWRITE)
-            func(path)
-        except Exception:
-            raise exc_info[1]
+    return _compile_gitignore_matcher(tuple(patterns))
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_gitignore_matcher(patterns: tuple[str, ...]) -> Callable[[str], bool]:
+    """
+    Compiles .gitignore patterns into a single matcher backed by one combined regex.
+    Each pattern's regex (as produced by pathspec's `GitWildMatchPattern`) becomes a named
+    alternative, listed in reverse file order so the first alternative the regex engine
+    accepts is the last matching pattern, mirroring gitignore's "last match wins" rule.
+    The winning alternative's polarity then decides whether the path is ignored, so
+    negated (`!`) patterns keep their meaning. Matching costs one C-level regex call per
+    path instead of a Python-level loop over every pattern, and pattern sets without
+    negations get a matcher that skips the polarity lookup entirely.
+
+    Args:
+        patterns (tuple[str, ...]): Raw .gitignore pattern lines.
+
+    Returns:
+        Callable[[str], bool]: A function taking a POSIX-style relative path (with a trailing
+                               '/' for directories) and returning True if the path is ignored.
+    """
+    from pathspec import PathSpec
+    from pathspec.patterns import GitWildMatchPattern
+
+    compiled = [
+        pattern
+        for pattern in PathSpec.from_lines(GitWildMatchPattern, patterns).patterns
+        if pattern.include is not None and pattern.regex is not None
+    ]
+    if not compiled:
+        return lambda path: False
+
+    includes: dict[str, bool] = {}
+    alternatives: list[str] = []
+    for index in range(len(compiled) - 1, -1, -1):
+        pattern = compiled[index]
+        group_name = f"p{index}"
+        includes[group_name] = bool(pattern.include)
+        # Inner named groups (e.g. pathspec's "ps_d") would clash once joined.
+        body = re.sub(r"\(\?P<[^>]+>", "(?:", pattern.regex.pattern)
+        alternatives.append(f"(?P<{group_name}>{body})")
+    match_combined = re.compile("|".join(alternatives)).match
+
+    # Specialize for the pattern set, which is fixed once compiled: without negations any
+    # match means "ignored", so the winning group never needs to be looked up.
+    if all(includes.values()):
+
+        def matches(path: str) -> bool:
+            return match_combined(path) is not None
+
     else:
-        raise exc_info[1]
+
+        def matches(path: str) -> bool:
+            match = match_combined(path)
+            return match is not None and includes[match.lastgroup]
+
+    return matches
+
+
+def patterns_match_basename_only(patterns: list[str]) -> bool:
+    """
+    Checks whether every .gitignore pattern applies to an entry's name regardless of its
+    directory. Per gitignore semantics that is the case when a pattern contains no '/'
+    apart from a trailing one, so such patterns can be tested against the basename alone.
+
+    Args:
+        patterns (list[str]): Raw .gitignore pattern lines.
+
+    Returns:
+        bool: True if no pattern depends on the directory an entry lives in.
+    """
+    for pattern in patterns:
+        body = pattern[1:] if pattern.startswith("!") else pattern
+        if "/" in body.rstrip("/"):
+            return False
+    return True
+
+
+def literal_directory_names(patterns: list[str]) -> frozenset[str]:
+    """
+    Collects the plain directory names (e.g. `node_modules/`, `build`) among .gitignore patterns,
+    so a walker can prune those directories with a set lookup instead of a regex match.
+    The set is only valid as a complete answer for these names when nothing can re-include
+    them, so it is empty whenever the patterns contain a negation.
+
+    Args:
+        patterns (list[str]): Raw .gitignore pattern lines.
+
+    Returns:
+        frozenset[str]: Directory names ignored wherever they appear.
+    """
+    names = set()
+    for pattern in patterns:
+        if pattern.startswith("!"):
+            return frozenset()
+        name = pattern.rstrip("/")
+        if name and not any(char in name for char in "/*?[\\"):
+            names.add(name)
+    return frozenset(names)
+
+
+def list_git_files(
+    repo_root: Path, pathspecs: list[str] | None = None
+) -> list[str] | None:
+    """
+    Lists the working-tree files Git considers part of the repository, using
+    `git ls-files`: tracked files plus untracked files that are not ignored.
+    Git applies nested .gitignore files, .git/info/exclude and the global
+    excludes file itself, so no pattern matching is needed on our side.
+    Tracked files that have been deleted from the working tree are omitted, as are
+    sparse-checkout (skip-worktree) entries that are not present on disk, and unmerged paths
+    (listed once per conflict stage) are reported only once. Git does not descend into
+    submodules or nested repositories: they are reported as a single directory path ending
+    in '/', whose contents the caller has to enumerate itself.
+
+    Args:
+        repo_root (Path): The root directory of the Git repository.
+        pathspecs (list[str] | None): Literal paths relative to `repo_root` to restrict the
+                                      listing to, or None for the whole repository.
+
+    Returns:
+        list[str] | None: Paths relative to `repo_root`, using forward slashes (directories
+                          end in '/'), or None if the `git` executable is unavailable or fails.
+    """
+    base_command = [
+        "git",
+        "--literal-pathspecs",
+        "-C",
+        str(repo_root),
+        "ls-files",
+        "-z",
+    ]
+    pathspec_args = ["--", *pathspecs] if pathspecs else []
+    try:
+        # -t tags skip-worktree entries with "S" and -s exposes gitlink modes; untracked
+        # entries keep the plain "? <path>" form.
+        listed = subprocess.run(
+            base_command
+            + ["-t", "-s", "--cached", "--others", "--exclude-standard"]
+            + pathspec_args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        ).stdout
+        deleted = subprocess.run(
+            base_command + ["--deleted"] + pathspec_args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    deleted_paths = set(deleted.split(b"\x00"))
+    paths: list[bytes] = []
+    for line in listed.split(b"\x00"):
+        if not line:
+            continue
+        tag, _, entry = line.partition(b" ")
+        if tag == b"?":
+            paths.append(entry)
+            continue
+        stage_info, _, raw_path = entry.partition(b"\t")
+        if raw_path in deleted_paths:
+            continue
+        if tag == b"S" and not os.path.lexists(repo_root / os.fsdecode(raw_path)):
+            continue
+        if stage_info.startswith(b"160000 "):
+            raw_path += b"/"
+        paths.append(raw_path)
+    return [os.fsdecode(raw_path) for raw_path in dict.fromkeys(paths)]
+
+
+def _make_tree_writable(path: Path):
+    """
+    Grants the owner full access on every directory under `path` that lacks it, in one pass
+    before `shutil.rmtree`. On Windows, read-only files (such as Git's pack files) are also made
+    writable so they delete on the first try instead of failing one by one; on POSIX, removing
+    a file only depends on its directory's mode, so files are left alone.
+    Symlinks are never followed, including `path` itself, and entries whose mode cannot be
+    changed are left for `shutil.rmtree` to report.
+
+    Args:
+        path (Path): The directory tree to prepare for removal.
+    """
+    if os.path.islink(path):
+        return
+    fix_file_modes = os.name == "nt"
+    pending_dirs = [str(path)]
+    try:
+        os.chmod(path, os.lstat(path).st_mode | stat.S_IRWXU)
+    except OSError:
+        pass
+    while pending_dirs:
+        try:
+            with os.scandir(pending_dirs.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_symlink():
+                continue
+            try:
+                mode = entry.stat(follow_symlinks=False).st_mode
+                if stat.S_ISDIR(mode):
+                    pending_dirs.append(entry.path)
+                    if mode & stat.S_IRWXU != stat.S_IRWXU:
+                        os.chmod(entry.path, mode | stat.S_IRWXU)
+                elif fix_file_modes and not mode & stat.S_IWUSR:
+                    os.chmod(entry.path, mode | stat.S_IWUSR)
+            except OSError:
+                continue
 
 
 def _remove_directory_robustly(
     path: Path, retries: int = 5, delay: float = 0.1, verbose: bool = False
 ):
     """
-    Attempts to remove a directory robustly, handling PermissionError by changing permissions
-    and implementing a retry mechanism with exponential backoff.
+    Attempts to remove a directory robustly: permissions are fixed up for the whole tree before
+    each attempt, and a retry mechanism with exponential backoff covers files that are
+    temporarily locked (e.g. by antivirus scanners).
 
     Args:
         path (Path): The path to the directory to remove.
         retries (int): The maximum number of retry attempts.
-        delay (float): The initial delay in seconds between retries.
+        delay (float): The initial delay in seconds between retries, growing by 1.5x per
+                       attempt up to `_MAX_RETRY_DELAY`.
         verbose (bool): If True, print verbose messages during retries.
 
     Raises:
@@ -108,7 +395,8 @@ def _remove_directory_robustly(
 
     for i in range(retries):
         try:
-            shutil.rmtree(path, onerror=_handle_remove_read_only)
+            _make_tree_writable(path)
+            shutil.rmtree(path)
             return
         except PermissionError:
             if verbose:
@@ -117,7 +405,7 @@ def _remove_directory_robustly(
                     err=True,
                 )
             time.sleep(delay)
-            delay *= 1.5
+            delay = min(delay * 1.5, _MAX_RETRY_DELAY)
         except Exception as e:
             raise GitSnapshotException(f"Error removing {path}: {e}") from e
 
@@ -126,12 +414,93 @@ def _remove_directory_robustly(
     )
 
 
+def _discard_directory(
+    path: Path, verbose: bool = False, trash_dir: Path | None = None
+):
+    """
+    Removes a directory without waiting for its contents to be deleted: it is renamed to a
+    unique hidden entry of `trash_dir` and handed to a background thread. If the rename fails
+    (e.g. a file in it is locked), the directory is removed synchronously instead. Call
+    `_wait_pending_cleanups` before relying on the trash being gone.
+
+    Args:
+        path (Path): The path to the directory to remove.
+        verbose (bool): If True, print verbose messages during removal.
+        trash_dir (Path | None): Where to rename the directory to, or None for its parent.
+
+    Raises:
+        GitSnapshotException: If the fallback synchronous removal fails.
+    """
+    trash_path = (trash_dir or path.parent) / f"{_TRASH_PREFIX}{uuid.uuid4().hex}"
+    try:
+        os.rename(path, trash_path)
+    except OSError:
+        _remove_directory_robustly(path, verbose=verbose)
+        return
+    _pending_cleanups.append(
+        (
+            trash_path,
+            _cleanup_pool.submit(
+                _remove_directory_robustly, trash_path, verbose=verbose
+            ),
+        )
+    )
+
+
+def _wait_pending_cleanups(verbose: bool = False):
+    """
+    Waits for every directory handed to the background by `_discard_directory` to be deleted.
+    Failures are reported as warnings, since the renamed trash no longer affects the restore.
+
+    Args:
+        verbose (bool): If True, print a message when there is something to wait for.
+    """
+    if verbose and _pending_cleanups:
+        click.echo("Waiting for cleared directories to finish deleting...")
+    while _pending_cleanups:
+        trash_path, cleanup = _pending_cleanups.pop()
+        try:
+            cleanup.result()
+        except Exception as e:
+            click.echo(
+                f"Warning: Could not remove cleared directory '{trash_path}': {e}",
+                err=True,
+            )
+
+
+def _excluded_child_names(directory: Path, exclusions: list[Path]) -> set[str]:
+    """
+    Reduces a list of excluded paths to the names of those that are direct children of
+    `directory`; exclusions anywhere else can never match one of its entries.
+
+    Args:
+        directory (Path): The directory whose entries will be checked.
+        exclusions (list[Path]): Paths to exclude.
+
+    Returns:
+        set[str]: Names of the excluded entries of `directory`.
+    """
+    resolved_directory = directory.resolve()
+    return {
+        resolved.name
+        for resolved in (p.resolve() for p in exclusions)
+        if resolved.parent == resolved_directory
+    }
+
+
 def _clear_directory_contents(
     target_dir: Path, exclusions: list[Path], verbose: bool = False
 ):
     """
     Clears the contents of target_dir, excluding paths in the exclusions list.
-    Exclusions should be resolved paths.
+    Exclusions should be resolved paths. Only exclusions that are direct children of the
+    target directory can match, so they are reduced to a set of names up front; entries are
+    typed from the cached `os.scandir` data, so no per-entry `stat` or path resolution is
+    needed. Symlinks are removed as links and never followed. Entries are removed by a thread
+    pool; files that cannot be removed produce a warning, while a directory that cannot be
+    removed raises once every other removal has finished. Directories are only renamed away
+    here, next to `target_dir` rather than inside it (see `_discard_directory`); their
+    contents are deleted in the background.
 
     Args:
         target_dir (Path): The directory whose contents need to be cleared.
@@ -141,33 +510,204 @@ def _clear_directory_contents(
     if not target_dir.is_dir():
         return
 
-    resolved_exclusions = {p.resolve() for p in exclusions}
+    excluded_names = _excluded_child_names(target_dir, exclusions)
 
-    for item in target_dir.iterdir():
-        if item.resolve() in resolved_exclusions:
-            if verbose:
-                click.echo(
-                    f"Skipping removal of protected directory/file: '{item.name}'"
+    with os.scandir(target_dir) as it:
+        entries = list(it)
+
+    with ThreadPoolExecutor(max_workers=_CLEAR_WORKERS) as executor:
+        file_removals = []
+        dir_removals = []
+        for entry in entries:
+            if entry.name in excluded_names:
+                if verbose:
+                    click.echo(
+                        f"Skipping removal of protected directory/file: '{entry.name}'"
+                    )
+                continue
+
+            if entry.is_dir(follow_symlinks=False):
+                dir_removals.append(
+                    executor.submit(
+                        _discard_directory,
+                        Path(entry.path),
+                        verbose=verbose,
+                        trash_dir=target_dir.parent,
+                    )
+                )
+            else:
+                file_removals.append(
+                    (entry.path, executor.submit(os.unlink, entry.path))
                 )
-            continue
 
-        if item.is_file():
+        for file_path, removal in file_removals:
             try:
-                item.unlink()
+                removal.result()
             except Exception as file_e:
                 click.echo(
-                    f"Warning: Could not remove file '{item}': {file_e}", err=True
+                    f"Warning: Could not remove file '{file_path}': {file_e}",
+                    err=True,
                 )
-        elif item.is_dir():
-            _remove_directory_robustly(item, verbose=verbose)
+        for removal in dir_removals:
+            removal.result()
+
+
+def _set_aside_directory(
+    directory: Path, exclusions: list[Path], verbose: bool = False
+) -> Path | None:
+    """
+    Moves a directory out of the way before a restore by renaming it to a hidden sibling,
+    then recreates it with its excluded entries moved back in. Unlike a stash, this costs
+    the same for any tree size and is undone by another rename (see
+    `_restore_set_aside_directory`).
+
+    Args:
+        directory (Path): The directory about to be restored over.
+        exclusions (list[Path]): Entries of `directory` that must stay in place.
+        verbose (bool): If True, print verbose messages.
+
+    Returns:
+        Path | None: The set-aside directory, or None if `directory` could not be moved aside
+                     (e.g. it is a mount point or its parent is read-only) and is unchanged;
+                     the caller should stash it instead.
+
+    Raises:
+        GitSnapshotException: If the directory was moved but neither recreated nor put back.
+    """
+    excluded_names = _excluded_child_names(directory, exclusions)
+    set_aside_path = (
+        directory.parent / f"{_SET_ASIDE_PREFIX}{directory.name}-{uuid.uuid4().hex}"
+    )
+    try:
+        os.rename(directory, set_aside_path)
+    except OSError as e:
+        if verbose:
+            click.echo(f"Could not move '{directory}' aside ({e}).")
+        return None
+
+    try:
+        directory.mkdir()
+        shutil.copymode(set_aside_path, directory)
+        for name in excluded_names:
+            os.rename(set_aside_path / name, directory / name)
+    except OSError as e:
+        _restore_set_aside_directory(set_aside_path, directory, exclusions, verbose)
+        if verbose:
+            click.echo(f"Could not recreate '{directory}' ({e}); moved it back.")
+        return None
+
+    if verbose:
+        click.echo(f"Moved existing '{directory}' aside to '{set_aside_path}'.")
+    return set_aside_path
+
+
+def _restore_set_aside_directory(
+    set_aside_path: Path, directory: Path, exclusions: list[Path], verbose: bool = False
+):
+    """
+    Undoes `_set_aside_directory` after a failed restore: the excluded entries are moved back
+    into the set-aside directory, whatever was extracted is removed, and the set-aside
+    directory is renamed back into place.
+
+    Args:
+        set_aside_path (Path): The path returned by `_set_aside_directory`.
+        directory (Path): The directory that was being restored.
+        exclusions (list[Path]): The exclusions passed to `_set_aside_directory`.
+        verbose (bool): If True, print verbose messages.
+
+    Raises:
+        GitSnapshotException: If the partial restore cannot be removed or the original
+                              directory cannot be renamed back.
+    """
+    if directory.is_dir():
+        for name in _excluded_child_names(directory, exclusions):
+            if os.path.lexists(directory / name):
+                os.rename(directory / name, set_aside_path / name)
+        _remove_directory_robustly(directory, verbose=verbose)
+    try:
+        os.rename(set_aside_path, directory)
+    except OSError as e:
+        raise GitSnapshotException(
+            f"Could not move '{set_aside_path}' back to '{directory}': {e}"
+        ) from e
+    if verbose:
+        click.echo(f"Moved previous contents back into '{directory}'.")
+
+
+def _stat_tarinfo(
+    arcname: str, st: os.stat_result, member_type: bytes
+) -> tarfile.TarInfo:
+    """
+    Builds a tar header from an already-taken stat result.
+
+    Args:
+        arcname (str): The member name.
+        st (os.stat_result): The entry's (l)stat result.
+        member_type (bytes): The tarfile member type (e.g. `tarfile.REGTYPE`).
+
+    Returns:
+        tarfile.TarInfo: The member header; `size` is set for regular files only.
+    """
+    info = tarfile.TarInfo(arcname)
+    info.type = member_type
+    info.mode = stat.S_IMODE(st.st_mode)
+    info.mtime = st.st_mtime
+    info.uid = st.st_uid
+    info.gid = st.st_gid
+    if member_type == tarfile.REGTYPE:
+        info.size = st.st_size
+    return info
+
+
+def _add_tree_to_tar(archive: tarfile.TarFile, path: str, arcname: str):
+    """
+    Adds a file or directory tree to a tar stream. On POSIX, directories are walked with
+    `os.fwalk`, and every entry is stat'ed, opened or read as a link relative to its parent's
+    descriptor (fstatat/openat/readlinkat) instead of resolving its full path from the root.
+    Elsewhere, and for anything but a real directory, `TarFile.add` is used.
+
+    Args:
+        archive (tarfile.TarFile): The tar stream being written.
+        path (str): The file or directory to add.
+        arcname (str): The member name for `path`; descendants are placed below it.
+    """
+    if not hasattr(os, "fwalk") or os.path.islink(path) or not os.path.isdir(path):
+        archive.add(path, arcname=arcname)
+        return
+
+    path_len = len(path)
+    for root, dirs, files, root_fd in os.fwalk(path):
+        arc_root = arcname + root[path_len:].replace(os.sep, "/")
+        archive.addfile(_stat_tarinfo(arc_root, os.fstat(root_fd), tarfile.DIRTYPE))
+        # Real subdirectories are yielded as roots of their own; only links among `dirs`
+        # (which fwalk lists but never follows) need handling here.
+        for name in dirs + files:
+            st = os.stat(name, dir_fd=root_fd, follow_symlinks=False)
+            member_name = f"{arc_root}/{name}"
+            if stat.S_ISREG(st.st_mode):
+                fd = os.open(name, os.O_RDONLY, dir_fd=root_fd)
+                with open(fd, "rb") as f:
+                    # Size the member from the open file, not the earlier lstat.
+                    info = _stat_tarinfo(member_name, os.fstat(fd), tarfile.REGTYPE)
+                    archive.addfile(info, f)
+            elif stat.S_ISLNK(st.st_mode):
+                info = _stat_tarinfo(member_name, st, tarfile.SYMTYPE)
+                info.linkname = os.readlink(name, dir_fd=root_fd)
+                archive.addfile(info)
+            elif not stat.S_ISDIR(st.st_mode):
+                archive.add(os.path.join(root, name), arcname=member_name)
 
 
 def _stash_directory_state(
-    directory_to_stash: Path, stash_base_dir: Path, verbose: bool = False
+    directory_to_stash: Path,
+    stash_base_dir: Path,
+    verbose: bool = False,
+    exclusions: list[Path] | None = None,
 ) -> Path | None:
     """
-    Creates a temporary 7z snapshot (stash) of the given directory's current state.
+    Creates a temporary snapshot (stash) of the given directory's current state.
     This is used during restoration to provide a rollback point if restoration fails.
+    The stash is a multi-threaded tar.zst when Zstandard is importable, otherwise a 7z.
     The stash is created within the provided `stash_base_dir`, which is typically
     a temporary directory managed by `tempfile.TemporaryDirectory`.
 
@@ -176,6 +716,8 @@ def _stash_directory_state(
         stash_base_dir (Path): The base directory where temporary stashes will be stored.
                                This should ideally be a path within a `tempfile.TemporaryDirectory`.
         verbose (bool): If True, print verbose messages.
+        exclusions (list[Path] | None): Entries of `directory_to_stash` that will not be cleared
+                                        and therefore need no stash.
 
     Returns:
         Path | None: The path to the created stash file, or None if no stash was created
@@ -187,33 +729,54 @@ def _stash_directory_state(
     if verbose:
         click.echo(f"Creating a temporary stash of '{directory_to_stash}'...")
 
+    try:
+        zstd = _import_zstd()
+    except GitSnapshotException:
+        zstd = None
+
     timestamp = time.strftime("%Y%m%d_%H%M%S")
-    stash_filename = f"restore_stash_{timestamp}.7z"
+    stash_filename = f"restore_stash_{timestamp}.{'tar.zst' if zstd else '7z'}"
     stash_filepath = stash_base_dir / stash_filename
 
     try:
-        if not directory_to_stash.is_dir() or not any(directory_to_stash.iterdir()):
+        entries = []
+        if directory_to_stash.is_dir():
+            excluded_names = _excluded_child_names(directory_to_stash, exclusions or [])
+            with os.scandir(directory_to_stash) as it:
+                entries = [entry for entry in it if entry.name not in excluded_names]
+        if not entries:
             if verbose:
                 click.echo(
                     f"Directory '{directory_to_stash}' is empty or does not exist. No stash created."
                 )
             return None
 
-        with py7zr.SevenZipFile(stash_filepath, "w") as archive:
-            for item in directory_to_stash.iterdir():
-                if item.is_file():
-                    archive.write(item, arcname=item.name)
-                elif item.is_dir():
-                    for root, _, files in os.walk(item):
-                        current_root_path = Path(root)
-                        for f in files:
-                            full_path = current_root_path / f
-                            relative_path_in_stash = full_path.relative_to(
-                                directory_to_stash
-                            )
-                            archive.write(
-                                full_path, arcname=str(relative_path_in_stash)
-                            )
+        if zstd:
+            with (
+                zstd.ZstdFile(
+                    stash_filepath,
+                    "w",
+                    options=_zstd_options(zstd, _STASH_ZSTD_LEVEL, None),
+                ) as compressed,
+                tarfile.open(fileobj=compressed, mode="w|") as archive,
+            ):
+                for entry in entries:
+                    _add_tree_to_tar(archive, entry.path, entry.name)
+            return stash_filepath
+
+        import py7zr
+
+        with py7zr.SevenZipFile(
+            stash_filepath,
+            "w",
+            filters=[{"id": py7zr.FILTER_ZSTD, "level": _STASH_ZSTD_LEVEL}],
+            blocksize=_STASH_BLOCKSIZE,
+        ) as archive:
+            # writeall() recurses into directories itself (keeping empty directories and
+            # symlinks), so no per-file relative path has to be computed here.
+            for entry in entries:
+                if entry.is_file() or entry.is_dir():
+                    archive.writeall(entry.path, arcname=entry.name)
         return stash_filepath
     except Exception as e:
         if stash_filepath.exists():
@@ -223,15 +786,24 @@ def _stash_directory_state(
         ) from e
 
 
-def _revert_from_stash(stash_filepath: Path, target_dir: Path, verbose: bool = False):
+def _revert_from_stash(
+    stash_filepath: Path,
+    target_dir: Path,
+    verbose: bool = False,
+    exclusions: list[Path] | None = None,
+):
     """
     Reverts the target directory to the state saved in the stash file.
-    This attempts to robustly clear the target_dir and then extract the stash.
+    This attempts to robustly clear the target_dir and then extract the stash. Background
+    deletions queued while clearing are awaited before returning or raising, so the caller
+    can safely remove `target_dir` itself afterwards.
 
     Args:
         stash_filepath (Path): The path to the stash file to revert from.
         target_dir (Path): The directory to revert to the stashed state.
         verbose (bool): If True, print verbose messages.
+        exclusions (list[Path] | None): Entries of `target_dir` that were left out of the
+                                        stash and must be kept while clearing.
 
     Raises:
         GitSnapshotException: If the stash file is invalid or reversion fails.
@@ -243,18 +815,18 @@ def _revert_from_stash(stash_filepath: Path, target_dir: Path, verbose: bool = F
 
     click.echo(f"Attempting to revert '{target_dir}' from stash.")
     try:
-        exclusions_for_clear: list[Path] = []
-        _clear_directory_contents(target_dir, exclusions_for_clear, verbose=verbose)
+        _clear_directory_contents(target_dir, exclusions or [], verbose=verbose)
 
         target_dir.mkdir(parents=True, exist_ok=True)
 
-        with py7zr.SevenZipFile(stash_filepath, mode="r") as z:
-            z.extractall(path=target_dir)
+        _extract_snapshot(stash_filepath, target_dir)
         click.echo(f"Successfully reverted '{target_dir}' from stash.")
     except Exception as e:
         raise GitSnapshotException(
             f"Error reverting from stash: {e}. Manual intervention may be required."
         ) from e
+    finally:
+        _wait_pending_cleanups(verbose)
 
 
 def _remove_dir_if_empty(path: Path, description: str, verbose: bool = False):
@@ -268,7 +840,9 @@ def _remove_dir_if_empty(path: Path, description: str, verbose: bool = False):
     """
     if path.is_dir():
         try:
-            if not any(path.iterdir()):
+            with os.scandir(path) as entries:
+                is_empty = next(entries, None) is None
+            if is_empty:
                 path.rmdir()
                 if verbose:
                     click.echo(f"Cleaned up empty {description} directory: {path}")
@@ -284,15 +858,21 @@ def _remove_dir_if_empty(path: Path, description: str, verbose: bool = False):
             )
 
 
-def _get_archive_app_name(snapshot_filepath: Path, verbose: bool) -> str:
+def _get_archive_app_name(
+    snapshot_filepath: Path,
+    verbose: bool,
+    archive: "py7zr.SevenZipFile | None" = None,
+) -> str:
     """
-    Inspects the 7z archive to determine the top-level directory name.
+    Inspects the snapshot archive to determine the top-level directory name.
     Snapshots created by `git-snapshot` are expected to have a single top-level directory
     matching the repository name.
 
     Args:
         snapshot_filepath (Path): The path to the snapshot file.
         verbose (bool): If True, print verbose messages.
+        archive (py7zr.SevenZipFile | None): The snapshot already opened by `_open_snapshot`,
+                                             to reuse its parsed header.
 
     Returns:
         str: The detected top-level directory name or an empty string if not found
@@ -303,22 +883,21 @@ def _get_archive_app_name(snapshot_filepath: Path, verbose: bool) -> str:
     """
     archive_app_name = ""
     try:
-        with py7zr.SevenZipFile(snapshot_filepath, mode="r") as z:
-            found_any_item = False
-            for item_info in z.list():
-                found_any_item = True
-                parts = item_info.filename.split("/")
-                if parts and parts[0]:
-                    archive_app_name = parts[0]
-                    break
-            if not found_any_item:
-                raise GitSnapshotException(
-                    "Snapshot appears to be empty or does not contain any entries."
-                )
-            if not archive_app_name:
-                click.echo(
-                    "Warning: Could not determine top-level directory name in snapshot. Contents will be extracted directly into the output directory."
-                )
+        found_any_item = False
+        for filename in _iter_archive_names(snapshot_filepath, archive):
+            found_any_item = True
+            parts = filename.split("/")
+            if parts and parts[0]:
+                archive_app_name = parts[0]
+                break
+        if not found_any_item:
+            raise GitSnapshotException(
+                "Snapshot appears to be empty or does not contain any entries."
+            )
+        if not archive_app_name:
+            click.echo(
+                "Warning: Could not determine top-level directory name in snapshot. Contents will be extracted directly into the output directory."
+            )
         if verbose and archive_app_name:
             click.echo(
                 f"Detected top-level directory '{archive_app_name}' within snapshot."
@@ -328,3 +907,431 @@ def _get_archive_app_name(snapshot_filepath: Path, verbose: bool) -> str:
         raise GitSnapshotException(
             f"Error inspecting snapshot: {e}. This might be due to a corrupted snapshot or an outdated 'py7zr' library. Consider updating 'py7zr'."
         ) from e
+
+
+def _open_snapshot(
+    snapshot_filepath: Path,
+) -> "contextlib.AbstractContextManager[py7zr.SevenZipFile | None]":
+    """
+    Opens a 7z snapshot once, so that inspecting and extracting it share one parsed header
+    (the expensive part of opening a large 7z). Other formats are streamed or cheap to
+    reopen, so for them the context manager yields None.
+
+    Args:
+        snapshot_filepath (Path): The path to the snapshot file.
+
+    Returns:
+        contextlib.AbstractContextManager[py7zr.SevenZipFile | None]: The open archive, or a
+                                                                      null context.
+
+    Raises:
+        GitSnapshotException: If the 7z header cannot be read.
+    """
+    if _snapshot_format(snapshot_filepath) != "7z":
+        return contextlib.nullcontext()
+    import py7zr
+
+    try:
+        return py7zr.SevenZipFile(snapshot_filepath, mode="r")
+    except Exception as e:
+        raise GitSnapshotException(
+            f"Error inspecting snapshot: {e}. This might be due to a corrupted snapshot or an outdated 'py7zr' library. Consider updating 'py7zr'."
+        ) from e
+
+
+def _snapshot_format(snapshot_filepath: Path) -> str:
+    """
+    Determines the archive format of a snapshot from its file name.
+
+    Args:
+        snapshot_filepath (Path): The path to the snapshot file.
+
+    Returns:
+        str: One of `SNAPSHOT_FORMATS`; anything unrecognized is treated as "7z".
+    """
+    name = snapshot_filepath.name.lower()
+    if name.endswith(".tar.zst"):
+        return "tar.zst"
+    if name.endswith(".zip"):
+        return "zip"
+    return "7z"
+
+
+def _import_zstd():
+    """
+    Imports the Zstandard module used for `.tar.zst` snapshots: the standard library's
+    `compression.zstd` on Python 3.14+, otherwise its `backports.zstd` backport.
+
+    Returns:
+        module: The zstd module.
+
+    Raises:
+        GitSnapshotException: If no Zstandard implementation is installed.
+    """
+    try:
+        from compression import zstd
+    except ImportError:
+        try:
+            from backports import zstd
+        except ImportError as e:
+            raise GitSnapshotException(
+                "The tar.zst format requires the 'backports.zstd' package on Python versions before 3.14. Install it with: pip install backports.zstd"
+            ) from e
+    return zstd
+
+
+def _zstd_options(zstd, level: int | None, threads: int | None) -> dict:
+    """
+    Builds the Zstandard compression parameters used for tar.zst archives.
+
+    Args:
+        zstd (module): The module returned by `_import_zstd`.
+        level (int | None): Compression level (1-22), or None for level 3.
+        threads (int | None): Worker threads, or None for one per CPU.
+
+    Returns:
+        dict: Options for `zstd.ZstdFile`.
+    """
+    return {
+        zstd.CompressionParameter.compression_level: 3 if level is None else level,
+        zstd.CompressionParameter.nb_workers: threads or os.cpu_count() or 1,
+    }
+
+
+@functools.cache
+def _native_7z_executable() -> str | None:
+    """
+    Locates a native 7-Zip executable: `7zz` (the official 7-Zip build for Linux and macOS)
+    or `7z`. The lookup is done once per process.
+
+    Returns:
+        str | None: The path to the executable, or None if neither is on PATH.
+    """
+    return shutil.which("7zz") or shutil.which("7z")
+
+
+def _write_native_7z(
+    output_filepath: Path,
+    entries: list[tuple[str, str]],
+    level: int | None = None,
+    threads: int | None = None,
+) -> bool:
+    """
+    Writes an LZMA2 7z archive with the native 7-Zip executable, which compresses on all
+    cores where py7zr uses a single thread. Names are handed over in a list file, relative to
+    the directory the sources share, so this only applies when every source path ends with
+    its arcname (as snapshot entries do). Symlinks are stored as links. The whole entry list
+    is buffered first, so unlike the py7zr path it does not overlap with a still-running
+    producer, and `_STORED_SUFFIXES` files are compressed with the rest rather than set aside
+    in a copy-only folder.
+
+    Args:
+        output_filepath (Path): The archive to create.
+        entries (list[tuple[str, str]]): Source file paths and their names inside the archive.
+        level (int | None): LZMA2 preset (0-9), or None for 7-Zip's default.
+        threads (int | None): Compression threads, or None to let 7-Zip use every core.
+
+    Returns:
+        bool: True if the archive was written, False if the caller should write it with
+              py7zr instead (no executable, entries that cannot be named relative to one
+              directory, or a failed 7-Zip run).
+    """
+    executable = _native_7z_executable()
+    if executable is None or not entries:
+        return False
+    first_source, first_arcname = entries[0]
+    base_dir = first_source[: len(first_source) - len(first_arcname)]
+    for source_path, arcname in entries:
+        if "\n" in arcname or source_path != base_dir + arcname.replace("/", os.sep):
+            return False
+
+    command = [executable, "a", "-t7z", "-m0=lzma2", f"-mmt={threads or 'on'}"]
+    if level is not None:
+        command.append(f"-mx={level}")
+    # -snl: store symlinks as links; -spd: list entries are names, not wildcards.
+    command += ["-snl", "-spd", "-scsUTF-8", "-bd", "-y"]
+    list_fd, list_path = tempfile.mkstemp(suffix=".lst")
+    try:
+        with open(list_fd, "w", encoding="utf-8") as list_file:
+            list_file.writelines(f"{arcname}\n" for _, arcname in entries)
+        command += [os.path.abspath(output_filepath), f"@{list_path}"]
+        result = subprocess.run(command, cwd=base_dir, capture_output=True, text=True)
+    except OSError as e:
+        result = subprocess.CompletedProcess(command, -1, "", str(e))
+    finally:
+        os.unlink(list_path)
+    if result.returncode != 0:
+        output_filepath.unlink(missing_ok=True)
+        reason = (result.stderr or result.stdout).strip().splitlines()
+        click.echo(
+            f"Warning: {executable} failed ({reason[-1] if reason else result.returncode}). Falling back to py7zr.",
+            err=True,
+        )
+        return False
+    return True
+
+
+def _write_snapshot_archive(
+    output_filepath: Path,
+    archive_format: str,
+    entries: Iterable[tuple[str, str]],
+    filters: list[dict[str, int]] | None = None,
+    level: int | None = None,
+    blocksize: int | None = None,
+    threads: int | None = None,
+) -> int:
+    """
+    Writes `(source path, arcname)` entries into a snapshot archive of the given format.
+    Entries are consumed lazily, so they may come from a still-running producer.
+    Already-compressed files (see `_STORED_SUFFIXES`) are stored without compression: in a
+    7z archive they are set aside and appended afterwards as a separate copy-only folder,
+    since py7zr writes one solid folder per session; zip stores them per entry. LZMA2 7z
+    archives are handed to a native 7-Zip executable when one is on PATH (see
+    `_write_native_7z`, which buffers the entries and has no copy-only folder), falling
+    back to py7zr.
+
+    Args:
+        output_filepath (Path): The archive to create.
+        archive_format (str): One of `SNAPSHOT_FORMATS`.
+        entries (Iterable[tuple[str, str]]): Source file paths and their names inside the archive.
+        filters (list[dict[str, int]] | None): py7zr filter chain, used by the "7z" format.
+        level (int | None): Compression level for "tar.zst" (1-22, default 3) and "zip" (0-9).
+        blocksize (int | None): py7zr read size, used by the "7z" format.
+        threads (int | None): Compression threads for "tar.zst" and native 7-Zip, or None for
+                              one per CPU.
+
+    Returns:
+        int: The number of entries written.
+
+    Raises:
+        GitSnapshotException: If py7zr reports a malformed 7z archive, or the format is
+                              not supported.
+    """
+    written = 0
+    if archive_format == "7z":
+        import py7zr
+
+        if _native_7z_executable() and all(
+            f["id"] == py7zr.FILTER_LZMA2 for f in filters or []
+        ):
+            # 7-Zip needs the full list up front, so the entries are collected first.
+            entries = list(entries)
+            preset = filters[0]["preset"] if filters else None
+            if _write_native_7z(output_filepath, entries, preset, threads):
+                return len(entries)
+
+        stored_entries = []
+        try:
+            with py7zr.SevenZipFile(
+                output_filepath, "w", filters=filters, blocksize=blocksize
+            ) as archive:
+                for source_path, arcname in entries:
+                    if os.path.splitext(source_path)[1].lower() in _STORED_SUFFIXES:
+                        stored_entries.append((source_path, arcname))
+                        continue
+                    archive.write(source_path, arcname=arcname)
+                    written += 1
+            if stored_entries:
+                with py7zr.SevenZipFile(
+                    output_filepath,
+                    "a",
+                    filters=[{"id": py7zr.FILTER_COPY}],
+                    blocksize=blocksize,
+                ) as archive:
+                    for source_path, arcname in stored_entries:
+                        archive.write(source_path, arcname=arcname)
+                        written += 1
+        except py7zr.Bad7zFile as e:
+            raise GitSnapshotException(
+                f"Error creating 7z archive: {e}. The file might be corrupted or there was an issue with compression."
+            ) from e
+    elif archive_format == "tar.zst":
+        zstd = _import_zstd()
+        with (
+            zstd.ZstdFile(
+                output_filepath,
+                "w",
+                options=_zstd_options(zstd, level, threads),
+            ) as compressed,
+            tarfile.open(fileobj=compressed, mode="w|") as archive,
+        ):
+            for source_path, arcname in entries:
+                archive.add(source_path, arcname=arcname, recursive=False)
+                written += 1
+    elif archive_format == "zip":
+        with zipfile.ZipFile(
+            output_filepath, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=level
+        ) as archive:
+            for source_path, arcname in entries:
+                if os.path.islink(source_path):
+                    # Store the link itself (target as data, S_IFLNK in the mode bits)
+                    # instead of letting zipfile follow it.
+                    link_stat = os.lstat(source_path)
+                    link_info = zipfile.ZipInfo(
+                        arcname, time.localtime(link_stat.st_mtime)[:6]
+                    )
+                    link_info.external_attr = link_stat.st_mode << 16
+                    archive.writestr(link_info, os.readlink(source_path))
+                elif os.path.splitext(source_path)[1].lower() in _STORED_SUFFIXES:
+                    archive.write(
+                        source_path, arcname=arcname, compress_type=zipfile.ZIP_STORED
+                    )
+                else:
+                    archive.write(source_path, arcname=arcname)
+                written += 1
+    else:
+        raise GitSnapshotException(f"Unsupported snapshot format: '{archive_format}'.")
+    return written
+
+
+def _iter_archive_names(
+    snapshot_filepath: Path, archive: "py7zr.SevenZipFile | None" = None
+) -> Iterator[str]:
+    """
+    Yields the member names of a snapshot archive of any supported format.
+
+    Args:
+        snapshot_filepath (Path): The path to the snapshot file.
+        archive (py7zr.SevenZipFile | None): An already-open 7z snapshot to read names from.
+
+    Yields:
+        str: Member names, using forward slashes.
+    """
+    archive_format = _snapshot_format(snapshot_filepath)
+    if archive_format == "tar.zst":
+        zstd = _import_zstd()
+        with (
+            zstd.ZstdFile(snapshot_filepath) as compressed,
+            tarfile.open(fileobj=compressed, mode="r|") as archive,
+        ):
+            for member in archive:
+                yield member.name
+    elif archive_format == "zip":
+        with zipfile.ZipFile(snapshot_filepath) as archive:
+            yield from archive.namelist()
+    elif archive is not None:
+        # The header is parsed on open; reading names straight from it avoids building
+        # a FileInfo record for every entry the way `list()` does.
+        for archived_file in archive.files:
+            yield archived_file.filename
+    else:
+        import py7zr
+
+        with py7zr.SevenZipFile(snapshot_filepath, mode="r") as z:
+            yield from _iter_archive_names(snapshot_filepath, z)
+
+
+def _is_within(root: str, path: str) -> bool:
+    """
+    Checks whether a real (symlink-free) path lies inside a real root directory.
+
+    Args:
+        root (str): The root directory, as returned by `os.path.realpath`.
+        path (str): The path to check, as returned by `os.path.realpath`.
+
+    Returns:
+        bool: True if `path` is `root` itself or below it.
+    """
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _zip_member_destination(root: str, member_name: str) -> str:
+    """
+    Maps a zip member name to its path under the extraction root, refusing names that could
+    land outside it: absolute names, `..` components, and names that resolve outside the
+    root through a symlink already on disk.
+
+    Args:
+        root (str): The extraction directory, as returned by `os.path.realpath`.
+        member_name (str): The member's name inside the archive.
+
+    Returns:
+        str: The member's destination path.
+
+    Raises:
+        GitSnapshotException: If the member would be written outside `root`.
+    """
+    parts = member_name.replace("\\", "/").split("/")
+    destination = os.path.join(root, *parts)
+    if (
+        member_name.startswith(("/", "\\"))
+        or os.path.isabs(member_name)
+        or os.path.splitdrive(member_name)[0]
+        or ".." in parts
+        or not _is_within(root, os.path.realpath(destination))
+    ):
+        raise GitSnapshotException(
+            f"Refusing to extract '{member_name}': it would be written outside '{root}'."
+        )
+    return destination
+
+
+def _extract_snapshot(
+    snapshot_filepath: Path,
+    output_dir: Path,
+    archive: "py7zr.SevenZipFile | None" = None,
+):
+    """
+    Extracts a snapshot archive of any supported format into `output_dir`, preserving file
+    permissions and symlinks (and, for 7z and tar.zst, modification times).
+
+    Args:
+        snapshot_filepath (Path): The path to the snapshot file.
+        output_dir (Path): The directory to extract into.
+        archive (py7zr.SevenZipFile | None): An already-open 7z snapshot to extract from.
+                                             Each handle can only be extracted once.
+
+    Raises:
+        GitSnapshotException: If a zip member would be written outside `output_dir` or
+                              through a symlink member.
+    """
+    archive_format = _snapshot_format(snapshot_filepath)
+    if archive_format == "tar.zst":
+        zstd = _import_zstd()
+        extract_options = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+        with (
+            zstd.ZstdFile(snapshot_filepath) as compressed,
+            tarfile.open(fileobj=compressed, mode="r|") as archive,
+        ):
+            archive.extractall(path=output_dir, **extract_options)
+    elif archive_format == "zip":
+        root = os.path.realpath(output_dir)
+        with zipfile.ZipFile(snapshot_filepath) as archive:
+            members = archive.infolist()
+            link_names = {
+                info.filename.rstrip("/")
+                for info in members
+                if stat.S_ISLNK(info.external_attr >> 16)
+            }
+            links = []
+            for info in members:
+                _zip_member_destination(root, info.filename)
+                mode = info.external_attr >> 16
+                if stat.S_ISLNK(mode):
+                    # Created only once every regular member is in place, so no member
+                    # can be written through a link from the same archive.
+                    links.append(info)
+                    continue
+                parts = info.filename.rstrip("/").split("/")
+                if any(
+                    "/".join(parts[:depth]) in link_names
+                    for depth in range(1, len(parts))
+                ):
+                    raise GitSnapshotException(
+                        f"Refusing to extract '{info.filename}': it would be written through a symlink."
+                    )
+                extracted_path = archive.extract(info, path=output_dir)
+                if stat.S_IMODE(mode) and not info.is_dir():
+                    os.chmod(extracted_path, stat.S_IMODE(mode))
+            for info in links:
+                # Re-checked here, as an earlier link may now sit on the member's path.
+                destination = _zip_member_destination(root, info.filename)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                os.symlink(archive.read(info).decode("utf-8"), destination)
+    elif archive is not None:
+        archive.extractall(path=output_dir)
+    else:
+        import py7zr
+
+        with py7zr.SevenZipFile(snapshot_filepath, mode="r") as z:
+            z.extractall(path=output_dir)
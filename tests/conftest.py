@@ -0,0 +1,97 @@
+# tests/conftest.py
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from git_snapshot.cli import cli
+
+
+def git(repo: Path, *args: str) -> str:
+    """Runs a git command in `repo` with a fixed identity and returns its stdout."""
+    return subprocess.run(
+        [
+            "git",
+            "-c",
+            "user.name=Test",
+            "-c",
+            "user.email=test@example.com",
+            "-c",
+            "protocol.file.allow=always",
+            "-C",
+            str(repo),
+            *args,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def make_git_repo(path: Path) -> Path:
+    """Initializes an empty Git repository at `path` with one commit."""
+    path.mkdir(parents=True)
+    git(path, "init", "-q")
+    (path / "README.md").write_text("readme\n")
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "init")
+    return path
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    """
+    A small repository with tracked, untracked, ignored, executable and symlinked files,
+    plus a nested .gitignore.
+    """
+    if shutil.which("git") is None:
+        pytest.skip("git is not installed")
+    repo = make_git_repo(tmp_path / "proj")
+    (repo / ".gitignore").write_text("build/\n*.log\n")
+    (repo / "src" / "pkg").mkdir(parents=True)
+    (repo / "src" / "pkg" / "mod.py").write_text("print('hi')\n")
+    (repo / "src" / "run.sh").write_text("#!/bin/sh\necho run\n")
+    os.chmod(repo / "src" / "run.sh", 0o755)
+    (repo / "sub").mkdir()
+    (repo / "sub" / ".gitignore").write_text("*.tmp\n")
+    (repo / "sub" / "keep.txt").write_text("keep\n")
+    (repo / "sub" / "skip.tmp").write_text("skip\n")
+    (repo / "build").mkdir()
+    (repo / "build" / "out.bin").write_text("built\n")
+    (repo / "app.log").write_text("log\n")
+    os.symlink("pkg/mod.py", repo / "src" / "link.py")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "content")
+    (repo / "untracked.txt").write_text("untracked\n")
+    return repo
+
+
+@pytest.fixture
+def run_cli():
+    """Invokes the git-snapshot CLI in-process and asserts on its exit code."""
+
+    def run(*args: str, expect_success: bool = True):
+        result = CliRunner().invoke(cli, [str(arg) for arg in args])
+        if expect_success:
+            assert result.exit_code == 0, result.output + repr(result.exception)
+        return result
+
+    return run
+
+
+def only_snapshot(directory: Path) -> Path:
+    """Returns the single snapshot file in `directory`."""
+    (snapshot,) = [p for p in directory.iterdir() if "_snapshot_" in p.name]
+    return snapshot
+
+
+def tree(root: Path) -> set[str]:
+    """Lists every path under `root` outside `.git`, relative and POSIX-style."""
+    return {
+        p.relative_to(root).as_posix()
+        for p in root.rglob("*")
+        if ".git" not in p.relative_to(root).parts
+    }
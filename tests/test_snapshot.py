@@ -0,0 +1,258 @@
+# tests/test_snapshot.py
+import os
+import re
+import stat
+import subprocess
+import sys
+import threading
+import zipfile
+
+import pytest
+
+from git_snapshot import core
+from git_snapshot.core import _walk_working_tree
+from git_snapshot.exceptions import GitSnapshotException
+from git_snapshot.utils import (
+    SNAPSHOT_FORMATS,
+    _clear_directory_contents,
+    _extract_snapshot,
+    _import_zstd,
+    _iter_archive_names,
+    _make_tree_writable,
+    _wait_pending_cleanups,
+    compile_gitignore_matcher,
+)
+
+# Local test helpers, importable because tests/ is on pytest's pythonpath (pyproject.toml).
+from conftest import git, make_git_repo, only_snapshot, tree
+
+EXPECTED_TREE = {
+    ".gitignore",
+    "README.md",
+    "src",
+    "src/pkg",
+    "src/pkg/mod.py",
+    "src/run.sh",
+    "src/link.py",
+    "sub",
+    "sub/.gitignore",
+    "sub/keep.txt",
+    "untracked.txt",
+}
+
+
+def _require_format(archive_format: str):
+    if archive_format == "tar.zst":
+        try:
+            _import_zstd()
+        except GitSnapshotException:
+            pytest.skip("Zstandard is not available")
+
+
+@pytest.mark.parametrize("archive_format", SNAPSHOT_FORMATS)
+def test_create_and_restore_round_trip(repo, tmp_path, run_cli, archive_format):
+    _require_format(archive_format)
+    snapshots = tmp_path / "snapshots"
+    run_cli("create", "-s", repo, "-o", snapshots, "--format", archive_format)
+    snapshot = only_snapshot(snapshots)
+    assert snapshot.name.endswith(f".{archive_format}")
+
+    out = tmp_path / "out"
+    (out / "proj" / "stale").mkdir(parents=True)
+    (out / "proj" / "stale" / "old.txt").write_text("old\n")
+    run_cli("restore", snapshot, "-o", out)
+
+    restored = out / "proj"
+    assert tree(restored) == EXPECTED_TREE
+    assert (restored / "sub" / "keep.txt").read_text() == "keep\n"
+    assert os.access(restored / "src" / "run.sh", os.X_OK)
+    assert os.readlink(restored / "src" / "link.py") == "pkg/mod.py"
+    assert git(restored, "status", "--porcelain") == "?? untracked.txt\n"
+    assert sorted(p.name for p in out.iterdir()) == ["proj"]
+
+
+# py7zr itself refuses to extract links that point outside the target directory.
+@pytest.mark.parametrize("archive_format", ["tar.zst", "zip"])
+def test_round_trip_keeps_links_pointing_outside_the_repo(
+    repo, tmp_path, run_cli, archive_format
+):
+    _require_format(archive_format)
+    shared = tmp_path / "shared.txt"
+    shared.write_text("shared\n")
+    os.symlink(shared, repo / "absolute_link")
+    os.symlink("../shared.txt", repo / "relative_link")
+    snapshots = tmp_path / "snapshots"
+    run_cli("create", "-s", repo, "-o", snapshots, "--format", archive_format)
+
+    out = tmp_path / "out"
+    run_cli("restore", only_snapshot(snapshots), "-o", out)
+
+    assert os.readlink(out / "proj" / "absolute_link") == str(shared)
+    assert os.readlink(out / "proj" / "relative_link") == "../shared.txt"
+
+
+def test_failed_write_stops_the_file_producer(repo, tmp_path, monkeypatch):
+    def failing_write(output_filepath, archive_format, entries, **kwargs):
+        next(iter(entries))
+        raise OSError("disk full")
+
+    monkeypatch.setattr(core, "_FILE_QUEUE_SIZE", 1)
+    monkeypatch.setattr(core, "_write_snapshot_archive", failing_write)
+    threads_before = set(threading.enumerate())
+    with pytest.raises(GitSnapshotException, match="disk full"):
+        core._create_snapshot_logic(repo, tmp_path / "snapshots")
+    assert set(threading.enumerate()) <= threads_before
+
+
+@pytest.mark.parametrize("archive_format", ["tar.zst", "zip"])
+def test_create_without_7z_does_not_import_py7zr(repo, tmp_path, archive_format):
+    _require_format(archive_format)
+    script = (
+        "import sys\n"
+        "from pathlib import Path\n"
+        "from git_snapshot.core import _create_snapshot_logic\n"
+        f"_create_snapshot_logic(Path({str(repo)!r}), Path({str(tmp_path / 'out')!r}),"
+        f" archive_format={archive_format!r})\n"
+        "assert 'py7zr' not in sys.modules\n"
+    )
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    subprocess.run([sys.executable, "-c", script], check=True, env=env)
+
+
+def test_default_output_is_excluded_from_the_snapshot(repo, run_cli):
+    (repo / "snapshots").mkdir()
+    (repo / "snapshots" / "older.txt").write_text("older\n")
+    run_cli("create", "-s", repo)
+    names = list(_iter_archive_names(only_snapshot(repo / "snapshots")))
+    assert "proj/src/pkg/mod.py" in names
+    assert not any(name.startswith("proj/snapshots") for name in names)
+
+
+def test_snapshot_includes_submodules_and_nested_repos(repo, tmp_path, run_cli):
+    library = make_git_repo(tmp_path / "library")
+    git(repo, "submodule", "add", "-q", str(library), "lib")
+    git(repo, "commit", "-q", "-m", "add submodule")
+    nested = make_git_repo(repo / "nested")
+    # Outer patterns must not reach into the nested repository's .git directory.
+    with open(repo / ".gitignore", "a") as gitignore:
+        gitignore.write("objects/\nlogs/\n")
+    run_cli("create", "-s", repo)
+    names = set(_iter_archive_names(only_snapshot(repo / "snapshots")))
+    assert {"proj/lib/README.md", "proj/lib/.git"} <= names
+    assert {"proj/nested/README.md", "proj/nested/.git/HEAD"} <= names
+    head = git(nested, "rev-parse", "HEAD").strip()
+    assert f"proj/nested/.git/objects/{head[:2]}/{head[2:]}" in names
+    assert "proj/nested/.git/logs/HEAD" in names
+
+
+def test_snapshot_skips_sparse_checkout_paths_missing_on_disk(repo, run_cli):
+    git(repo, "sparse-checkout", "set", "src")
+    assert not (repo / "sub").exists()
+    run_cli("create", "-s", repo)
+    names = set(_iter_archive_names(only_snapshot(repo / "snapshots")))
+    assert "proj/src/pkg/mod.py" in names
+    assert not any(name.startswith("proj/sub/") for name in names)
+
+
+def test_directory_patterns_match_directories_only():
+    matches = compile_gitignore_matcher(["build/"])
+    assert matches("build/")
+    assert matches("src/build/")
+    assert not matches("build")
+
+    # Like git, a pattern without a trailing slash applies to directories too.
+    matches = compile_gitignore_matcher(["*.log"])
+    assert matches("app.log")
+    assert matches("foo.log/")
+
+
+def test_fallback_walker_prunes_ignored_directories(repo):
+    files = set(_walk_working_tree(repo, None))
+    assert "sub/keep.txt" in files
+    assert not any(f.startswith("build/") for f in files)
+    assert "app.log" not in files
+    assert "sub/skip.tmp" not in files
+
+
+@pytest.mark.parametrize("archive_format", SNAPSHOT_FORMATS)
+def test_restore_relative_snapshot_from_inside_target(
+    repo, run_cli, monkeypatch, archive_format
+):
+    _require_format(archive_format)
+    run_cli("create", "-s", repo, "--format", archive_format)
+    snapshot = only_snapshot(repo / "snapshots")
+    (repo / "src" / "pkg" / "mod.py").write_text("changed\n")
+
+    monkeypatch.chdir(repo)
+    run_cli("restore", f"snapshots/{snapshot.name}", "-o", "..")
+
+    assert (repo / "src" / "pkg" / "mod.py").read_text() == "print('hi')\n"
+    assert (repo / "snapshots" / snapshot.name).is_file()
+
+
+def _write_zip(path, members):
+    """Writes a zip whose members are (name, data) files or (name, target, True) symlinks."""
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data, *is_link in members:
+            info = zipfile.ZipInfo(name)
+            info.external_attr = ((stat.S_IFLNK | 0o777) if is_link else 0o644) << 16
+            archive.writestr(info, data)
+    return path
+
+
+@pytest.mark.parametrize(
+    "members, refused",
+    [
+        (
+            [("app/link", "../..", True), ("app/link/pwned.txt", "pwned\n")],
+            "app/link/pwned.txt",
+        ),
+        (
+            [("app/link", "/", True), ("app/link/pwned.txt", "pwned\n")],
+            "app/link/pwned.txt",
+        ),
+        ([("app/../../escape_link", "app", True)], "app/../../escape_link"),
+        ([("app/../../pwned.txt", "pwned\n")], "app/../../pwned.txt"),
+        ([("/pwned.txt", "pwned\n")], "/pwned.txt"),
+    ],
+)
+def test_zip_extraction_stays_inside_output_dir(tmp_path, members, refused):
+    snapshot = _write_zip(tmp_path / "evil_snapshot_1.zip", members)
+    out = tmp_path / "a" / "b" / "out"
+    out.mkdir(parents=True)
+    with pytest.raises(GitSnapshotException, match=re.escape(f"'{refused}'")):
+        _extract_snapshot(snapshot, out)
+    outside = {
+        p.relative_to(tmp_path).as_posix()
+        for p in tmp_path.rglob("*")
+        if out not in p.parents
+    }
+    assert outside == {"evil_snapshot_1.zip", "a", "a/b", "a/b/out"}
+    assert not (tmp_path / "pwned.txt").exists()
+
+
+def test_make_tree_writable_does_not_follow_a_symlinked_root(tmp_path):
+    target = tmp_path / "target"
+    target.mkdir(mode=0o700)
+    (target / "file.txt").write_text("data\n")
+    os.chmod(target / "file.txt", 0o400)
+    link = tmp_path / "link"
+    os.symlink(target, link)
+
+    _make_tree_writable(link)
+
+    assert stat.S_IMODE(target.stat().st_mode) == 0o700
+    assert stat.S_IMODE((target / "file.txt").stat().st_mode) == 0o400
+
+
+def test_clear_directory_contents_keeps_trash_outside_the_target(tmp_path):
+    target = tmp_path / "target"
+    (target / "dir" / "nested").mkdir(parents=True)
+    (target / "dir" / "nested" / "file.txt").write_text("data\n")
+    (target / "file.txt").write_text("data\n")
+
+    _clear_directory_contents(target, [])
+    assert list(target.iterdir()) == []
+
+    _wait_pending_cleanups()
+    assert [p.name for p in tmp_path.iterdir()] == ["target"]